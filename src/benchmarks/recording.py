@@ -0,0 +1,74 @@
+"""
+Benchmark of recording memory: the old list of chunks joined at the end against RecordingBuffer.
+Simulates one-minute and one-hour push-to-talk recordings and reports the peak RSS of recording and uploading them.
+
+Run from the src folder (Linux and macOS):
+    python -m benchmarks.recording
+"""
+import argparse
+import base64
+import multiprocessing
+import resource
+import sys
+import tempfile
+
+from utils.recording import RecordingBuffer, iter_chunks, UPLOAD_CHUNK
+
+RATE = 24000
+# 1024 samples of PCM16, what stream.read returns
+CHUNK = bytearray(b"\x01\x00" * 1024)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def upload(view) -> int:
+    """Base64 encode the recording in parts like RealtimeClient.send_audio, return the encoded size."""
+    return sum(len(base64.b64encode(chunk)) for chunk in iter_chunks(memoryview(view), UPLOAD_CHUNK))
+
+
+def record_list(n_chunks: int) -> int:
+    frames = []
+    for _ in range(n_chunks):
+        frames.append(bytes(CHUNK))
+    audio = b"".join(frames)
+    return upload(audio)
+
+
+def record_buffer(n_chunks: int, directory: str) -> int:
+    recording = RecordingBuffer(directory=directory)
+    for _ in range(n_chunks):
+        recording.write(bytes(CHUNK))
+    return upload(recording.finish())
+
+
+def run(method: str, seconds: float, directory: str, results) -> None:
+    n_chunks = int(seconds * RATE / 1024)
+    baseline = peak_rss_mb()
+    if method == "list":
+        record_list(n_chunks)
+    else:
+        record_buffer(n_chunks, directory)
+    results.put((baseline, peak_rss_mb()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--durations", type=float, nargs="+", default=[60, 3600], help="Recording lengths in seconds")
+    args = parser.parse_args()
+
+    # Every measurement in a fresh process, the peak RSS never goes down
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for seconds in args.durations:
+            audio_mb = seconds * RATE * 2 / 1024 / 1024
+            for method in ("list", "RecordingBuffer"):
+                results = context.Queue()
+                process = context.Process(target=run, args=(method, seconds, tmp, results))
+                process.start()
+                baseline, peak = results.get()
+                process.join()
+                print(f"{seconds:6.0f} s ({audio_mb:6.1f} MB of audio)  {method:<16} peak RSS {peak:7.1f} MB  (+{peak - baseline:6.1f} MB)")
@@ -0,0 +1,135 @@
+"""
+Microbenchmark of the audio hand-off between threads: queue.Queue of bytes (the old path) against RingBuffer.
+
+Run from the src folder:
+    python -m benchmarks.ring_buffer
+"""
+import argparse
+import asyncio
+import queue
+import threading
+import time
+import tracemalloc
+
+from utils.ring_buffer import RingBuffer
+
+# A bytearray, so bytes(CHUNK) really allocates like stream.read does
+CHUNK = bytearray(b"\x01\x00" * 1024)
+
+
+def producer_queue(q: queue.Queue, n_chunks: int):
+    for _ in range(n_chunks):
+        # Like stream.read, every chunk is a new bytes object
+        q.put(bytes(CHUNK))
+    q.put(None)
+
+
+def producer_ring(ring: RingBuffer, n_chunks: int):
+    data = bytes(CHUNK)
+    for _ in range(n_chunks):
+        while ring.free < len(data):
+            time.sleep(0)
+        ring.write(data)
+
+
+def bench_thread_queue(n_chunks: int) -> float:
+    q = queue.Queue(maxsize=1024)
+    producer = threading.Thread(target=producer_queue, args=(q, n_chunks))
+    start = time.perf_counter()
+    producer.start()
+    while q.get() is not None:
+        pass
+    producer.join()
+    return time.perf_counter() - start
+
+
+def bench_thread_ring(n_chunks: int) -> float:
+    ring = RingBuffer(len(CHUNK) * 1024)
+    out = bytearray(len(CHUNK))
+    producer = threading.Thread(target=producer_ring, args=(ring, n_chunks))
+    total = n_chunks * len(CHUNK)
+    received = 0
+    start = time.perf_counter()
+    producer.start()
+    while received < total:
+        if ring.wait(timeout=0.1):
+            received += ring.read_into(out)
+    producer.join()
+    return time.perf_counter() - start
+
+
+async def bench_loop_queue(n_chunks: int) -> float:
+    loop = asyncio.get_running_loop()
+    q = asyncio.Queue()
+
+    def produce():
+        for _ in range(n_chunks):
+            loop.call_soon_threadsafe(q.put_nowait, bytes(CHUNK))
+        loop.call_soon_threadsafe(q.put_nowait, None)
+
+    producer = threading.Thread(target=produce)
+    start = time.perf_counter()
+    producer.start()
+    while await q.get() is not None:
+        pass
+    producer.join()
+    return time.perf_counter() - start
+
+
+async def bench_loop_ring(n_chunks: int) -> float:
+    ring = RingBuffer(len(CHUNK) * 1024)
+    producer = threading.Thread(target=producer_ring, args=(ring, n_chunks))
+    total = n_chunks * len(CHUNK)
+    received = 0
+    start = time.perf_counter()
+    producer.start()
+    while received < total:
+        await ring.wait_async()
+        received += len(ring.read())
+    producer.join()
+    return time.perf_counter() - start
+
+
+def bench_handoff_queue(n_chunks: int) -> float:
+    """Cost of one put and one get without any thread switching."""
+    q = queue.Queue(maxsize=1024)
+    start = time.perf_counter()
+    for _ in range(n_chunks):
+        q.put(bytes(CHUNK))
+        q.get()
+    return time.perf_counter() - start
+
+
+def bench_handoff_ring(n_chunks: int) -> float:
+    """Cost of one write and one read without any thread switching."""
+    ring = RingBuffer(len(CHUNK) * 1024)
+    out = bytearray(len(CHUNK))
+    start = time.perf_counter()
+    for _ in range(n_chunks):
+        ring.write(CHUNK)
+        ring.read_into(out)
+    return time.perf_counter() - start
+
+
+def measure(name: str, run, n_chunks: int):
+    elapsed = run(n_chunks)
+    # Separate run for memory, tracing slows everything down
+    tracemalloc.start()
+    run(n_chunks // 10)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<30} {elapsed * 1e6 / n_chunks:8.2f} us/chunk   peak {peak / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    args = parser.parse_args()
+
+    measure("hand-off, queue", bench_handoff_queue, args.chunks)
+    measure("hand-off, ring", bench_handoff_ring, args.chunks)
+    # Saturated producers, dominated by GIL switching between the two threads
+    measure("thread -> thread, queue", bench_thread_queue, args.chunks)
+    measure("thread -> thread, ring", bench_thread_ring, args.chunks)
+    measure("thread -> loop, asyncio.Queue", lambda n: asyncio.run(bench_loop_queue(n)), args.chunks)
+    measure("thread -> loop, ring", lambda n: asyncio.run(bench_loop_ring(n)), args.chunks)
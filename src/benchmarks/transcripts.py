@@ -0,0 +1,111 @@
+"""
+Benchmark of transcript persistence: TranscriptSink against a synchronous insert and commit in the event handler.
+Measures write throughput and how much the handlers delay the event loop.
+
+Run from the src folder:
+    python -m benchmarks.transcripts
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from utils.transcripts import TranscriptSink, SCHEMA
+
+
+def make_events(n_utterances: int, deltas_per_utterance: int):
+    """The event sequence of n assistant replies streamed in deltas, each followed by a student utterance."""
+    events = []
+    for i in range(n_utterances):
+        item_id = f"item_{i}"
+        for j in range(deltas_per_utterance):
+            events.append({"type": "response.audio_transcript.delta", "response_id": f"resp_{i}", "item_id": item_id, "delta": f"slovo{j} "})
+        events.append({"type": "response.done", "response": {"id": f"resp_{i}"}})
+        events.append({"type": "conversation.item.input_audio_transcription.completed", "item_id": f"user_{i}", "transcript": "Kdy musím dát přednost tramvaji?"})
+    return events
+
+
+class SyncSink:
+    """The naive handler: one INSERT and COMMIT per finished utterance, on the event loop."""
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.parts = {}
+
+    def handle(self, event):
+        if event["type"] == "response.audio_transcript.delta":
+            self.parts.setdefault(event["item_id"], []).append(event["delta"])
+        elif event["type"] == "response.done":
+            for item_id, parts in list(self.parts.items()):
+                self._insert("assistant", item_id, "".join(parts))
+            self.parts.clear()
+        else:
+            self._insert("user", event["item_id"], event["transcript"])
+
+    def _insert(self, role, item_id, text):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO utterances (session, role, item_id, text, complete, created_at) VALUES (?, ?, ?, ?, 1, ?)",
+                ("bench", role, item_id, text, time.time())
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+async def run(handle, events, batch: int):
+    """Feed events in bursts like handle_messages does, while a ticker measures how late the loop wakes up."""
+    lags = []
+    done = False
+
+    async def ticker():
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start - 0.001)
+
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    for i in range(0, len(events), batch):
+        for event in events[i:i + batch]:
+            handle(event)
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    done = True
+    await ticker_task
+
+    lags.sort()
+    return elapsed, lags[int(0.99 * (len(lags) - 1))] if lags else 0.0, lags[-1] if lags else 0.0
+
+
+def report(name, n_rows, elapsed, p99, worst):
+    print(f"{name:<14} {n_rows / elapsed:10.0f} rows/s   loop lag p99 {p99 * 1000:7.2f} ms   max {worst * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--utterances", type=int, default=5000)
+    parser.add_argument("--deltas", type=int, default=20)
+    args = parser.parse_args()
+
+    events = make_events(args.utterances, args.deltas)
+    n_rows = args.utterances * 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_sink = SyncSink(os.path.join(tmp, "sync.db"))
+        elapsed, p99, worst = asyncio.run(run(sync_sink.handle, events, 50))
+        sync_sink.close()
+        report("synchronous", n_rows, elapsed, p99, worst)
+
+        sink = TranscriptSink(os.path.join(tmp, "sink.db"), session="bench")
+        handlers = sink.handlers()
+        start = time.perf_counter()
+        _, p99, worst = asyncio.run(run(lambda event: handlers[event["type"]](event), events, 50))
+        # Throughput includes waiting for the writer to flush everything
+        sink.close()
+        elapsed = time.perf_counter() - start
+        report("TranscriptSink", n_rows, elapsed, p99, worst)
+        print(f"               {sink.stats()}")
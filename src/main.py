@@ -11,6 +11,8 @@ from tkinter import ttk
 import threading
 import os
 
+from utils.recording import RecordingBuffer, iter_chunks, UPLOAD_CHUNK
+
 # Set-up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -47,7 +49,6 @@ class AudioChatApp:
         self.status_label.pack(pady=10)
 
         self.p = pyaudio.PyAudio()
-        self.frames = []
         self.audio_queue = asyncio.Queue()
 
     def toggle_recording(self):
@@ -72,16 +73,17 @@ class AudioChatApp:
                              rate=sample_rate, input=True,
                              frames_per_buffer=chunk_size)
 
-        self.frames = []
+        # Kept in memory up to a limit and on disk beyond it, so a forgotten recording cannot eat up the memory
+        recording = RecordingBuffer()
         while self.is_recording:
             data = stream.read(chunk_size)
-            self.frames.append(data)
+            recording.write(data)
 
         logging.info("Stopped recording...")
         stream.stop_stream()
         stream.close()
 
-        audio_data = b''.join(self.frames)
+        audio_data = recording.finish()
         asyncio.run_coroutine_threadsafe(self.audio_queue.put(audio_data), self.loop)
 
     async def process_audio(self):
@@ -93,12 +95,12 @@ class AudioChatApp:
         self.is_receiving = True
         self.master.after(0, lambda: self.button.config(text="Nelze nahrávat", state=tk.DISABLED))
         
-        base64_audio = base64.b64encode(audio_data).decode('utf-8')
-
-        await self.ws.send(json.dumps({
-            "type": "input_audio_buffer.append",
-            "audio": base64_audio
-        }))
+        # Sent in parts straight from the recording buffer
+        for chunk in iter_chunks(audio_data, UPLOAD_CHUNK):
+            await self.ws.send(json.dumps({
+                "type": "input_audio_buffer.append",
+                "audio": base64.b64encode(chunk).decode('utf-8')
+            }))
 
         await self.ws.send(json.dumps({
             "type": "input_audio_buffer.commit"
@@ -0,0 +1,67 @@
+"""
+Renders the fixed phrases from utils/data/prompts.json with the Realtime API, so the apps can play them
+without a roundtrip. Run once per voice and again whenever the phrases change, e.g.:
+    python prerender.py --voice alloy --format g711_ulaw
+"""
+import argparse
+import asyncio
+import configparser
+import os
+
+from utils import RealtimeClient, TurnDetectionMode, PromptStore, logger
+from utils.prompts import load_phrases, EXTENSIONS, DEFAULT_PROMPTS_DIR
+
+READ_INSTRUCTIONS = "Přečti nahlas přesně následující text, nic nepřidávej ani nevynechávej. Mluv přirozeně a přátelsky.\n\n"
+
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument("--voice", default="alloy")
+parser.add_argument("--format", choices=list(EXTENSIONS), default="pcm16", help="PCM16 plays from mmap, G.711 is six times smaller")
+parser.add_argument("--out", default=DEFAULT_PROMPTS_DIR, help="The folder of the prompt store")
+parser.add_argument("phrases", nargs="*", help="The phrase IDs to render, all of them by default")
+args = parser.parse_args()
+
+# Read configuration
+current_dir = os.path.dirname(os.path.realpath(__file__))
+config_path = os.path.join(current_dir, "config.ini")
+config = configparser.ConfigParser()
+config.read(config_path)
+OPENAI_KEY = config["DEFAULT"]["OPENAI_KEY"]
+
+async def main():
+    phrases = load_phrases()
+    unknown = [phrase_id for phrase_id in args.phrases if phrase_id not in phrases]
+    if unknown:
+        parser.error(f"unknown phrases: {', '.join(unknown)}")
+
+    store = PromptStore(args.out, args.voice)
+    audio = bytearray()
+    done = asyncio.Event()
+    client = RealtimeClient(
+        api_key=OPENAI_KEY,
+        voice=args.voice,
+        turn_detection_mode=TurnDetectionMode.MANUAL,
+        on_audio_delta=audio.extend,
+        extra_event_handlers={"response.done": lambda event: done.set()},
+        output_audio_format=args.format,
+    )
+
+    await client.connect()
+    message_handler = asyncio.create_task(client.handle_messages())
+    try:
+        for phrase_id in args.phrases or list(phrases):
+            audio.clear()
+            done.clear()
+            # Out of band, the phrases must not influence each other
+            await client.create_response(instructions=READ_INSTRUCTIONS + phrases[phrase_id], out_of_band=True)
+            await asyncio.wait_for(done.wait(), timeout=60)
+            if not audio:
+                logger.error(f"No audio received for {phrase_id}")
+                continue
+            path = store.save(phrase_id, args.voice, args.format, audio)
+            logger.info(f"{phrase_id}: {len(audio)} bytes saved to {path}")
+    finally:
+        await client.close()
+        await message_handler
+
+if __name__ == "__main__":
+    asyncio.run(main())
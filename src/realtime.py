@@ -1,17 +1,36 @@
+import time
+
+# Taken before anything else is imported, startup times are measured from here
+LAUNCH_TIME = time.perf_counter()
+
 import asyncio
 import configparser
 import argparse
 import logging
 import os
 
-from pynput import keyboard
-from utils import RealtimeClient, AudioHandler, TurnDetectionMode, InputHandler, logger
+from utils import RealtimeClient, TurnDetectionMode, InputHandler, ToolRuntime, TrafficRulesIndex, StartupTimer, QualityController, logger
+
+IMPORTS_DONE = time.perf_counter()
 
 # Argument parser
 parser = argparse.ArgumentParser(description="Realtime API CLI with Server VAD")
 parser.add_argument("--debug", action="store_true")
+parser.add_argument("--local-vad", action="store_true", help="Detect the end of turn locally instead of using server VAD")
+parser.add_argument("--dsp", action="store_true", help="Run noise suppression and gain control on the microphone audio")
+parser.add_argument("--auto-buffer", action="store_true", help="Tune the audio device buffers from measured underruns and overflows")
+parser.add_argument("--adaptive-quality", action="store_true", help="Adapt the upstream audio and the response modalities to the link quality")
+parser.add_argument("--transcripts", metavar="PATH", help="Store the conversation transcript in this SQLite database")
+parser.add_argument("--http-audio", metavar="[HOST:]PORT", help="Serve the assistant audio as a WAV stream over HTTP")
+parser.add_argument("--unix-audio", metavar="PATH", help="Serve the raw assistant audio on a UNIX socket")
+parser.add_argument("--wav-audio", metavar="DIR", help="Write the assistant audio into rolling WAV files")
+parser.add_argument("--audio-format", choices=["pcm16", "g711_ulaw", "g711_alaw"], default="pcm16", help="The format of the assistant audio")
+parser.add_argument("--no-playback", action="store_true", help="Do not play the assistant audio on the local device")
 args = parser.parse_args()
 
+if args.audio_format != "pcm16" and not args.no_playback:
+    parser.error("only pcm16 can be played locally, use --no-playback with G.711")
+
 if args.debug:
     logger.setLevel(logging.DEBUG)
 
@@ -22,26 +41,146 @@ config = configparser.ConfigParser()
 config.read(config_path)
 OPENAI_KEY = config["DEFAULT"]["OPENAI_KEY"]
 
+def open_audio(timer, capture_buffer):
+    """Import PyAudio, enumerate the devices and open the microphone. Runs in a thread while connecting."""
+    with timer.phase("audio devices"):
+        from utils import AudioHandler, BufferTuner, PromptStore
+
+        prompt_store = PromptStore()
+        prompt_store.preload()
+        audio_handler = AudioHandler(
+            capture_buffer=capture_buffer,
+            buffer_tuner=BufferTuner() if args.auto_buffer else None,
+            prompt_store=prompt_store
+        )
+        audio_handler.open_input_stream()
+    if not args.no_playback:
+        # Greet right away, the greeting is pre-rendered and does not wait for the connection
+        audio_handler.play_prompt("greeting")
+    return audio_handler
+
+def start_keyboard(timer, input_handler):
+    """Import pynput and start the keyboard listener. Runs in a thread while connecting."""
+    with timer.phase("keyboard"):
+        return input_handler.start_listener()
+
+async def connect(timer, client):
+    with timer.phase("connect"):
+        await client.connect()
+
+async def start_sinks(broadcaster):
+    """Start the output sinks selected on the command line."""
+    from utils import HTTPAudioSink, UnixSocketAudioSink, WavFileSink
+
+    sinks = []
+    if args.http_audio:
+        host, _, port = args.http_audio.rpartition(":")
+        sinks.append(HTTPAudioSink(broadcaster, host or "127.0.0.1", int(port)))
+    if args.unix_audio:
+        sinks.append(UnixSocketAudioSink(broadcaster, args.unix_audio))
+    if args.wav_audio:
+        sinks.append(WavFileSink(broadcaster, args.wav_audio))
+    for sink in sinks:
+        await sink.start()
+    return sinks
+
 async def main():
-    audio_handler = AudioHandler()
+    timer = StartupTimer(LAUNCH_TIME)
+    timer.add_phase("imports", LAUNCH_TIME, IMPORTS_DONE)
+
+    audio_handler = None
+    listener = None
+    dsp_stage = None
+    transcript_sink = None
+    broadcaster = None
+    sinks = []
     input_handler = InputHandler()
     input_handler.loop = asyncio.get_running_loop()
+
+    with timer.phase("tool index"):
+        tool_runtime = ToolRuntime()
+        TrafficRulesIndex().register(tool_runtime)
+
+    if args.transcripts:
+        from utils import TranscriptSink
+
+        transcript_sink = TranscriptSink(args.transcripts)
+
+    if args.http_audio or args.unix_audio or args.wav_audio:
+        from utils import AudioBroadcaster
+
+        broadcaster = AudioBroadcaster(args.audio_format)
+
+    def on_audio_delta(audio):
+        if audio_handler and not args.no_playback:
+            audio_handler.play_audio(audio)
+        if broadcaster:
+            broadcaster.write(audio)
+
+    def on_interrupt():
+        if audio_handler:
+            audio_handler.stop_playback_immediately()
+        if broadcaster:
+            broadcaster.interrupt()
+
+    def play_prompt(phrase_id):
+        """Play a pre-rendered phrase, returns its duration in seconds."""
+        if audio_handler and not args.no_playback and not quitting:
+            return audio_handler.play_prompt(phrase_id)
+        return 0.0
+
+    def on_error(event):
+        # Invalid requests, e.g. cancelling a response that already finished, are not worth telling the user about
+        if event["error"].get("code") == "rate_limit_exceeded":
+            play_prompt("rate_limited")
+        elif event["error"].get("type") == "server_error":
+            play_prompt("error")
+
+    event_handlers = transcript_sink.handlers() if transcript_sink else {}
+    event_handlers["error"] = on_error
+    quitting = False
     
     client = RealtimeClient(
         api_key = OPENAI_KEY,
         on_text_delta=lambda text: print(f"Assistant: {text}", end="", flush=True),
-        on_audio_delta=lambda audio: audio_handler.play_audio(audio),
-        on_interrupt=lambda: audio_handler.stop_playback_immediately(),
-        turn_detection_mode=TurnDetectionMode.SERVER_VAD,
+        on_audio_delta=on_audio_delta,
+        on_interrupt=on_interrupt,
+        turn_detection_mode=TurnDetectionMode.LOCAL_VAD if args.local_vad else TurnDetectionMode.SERVER_VAD,
+        tool_runtime=tool_runtime,
+        extra_event_handlers=event_handlers,
+        output_audio_format=args.audio_format,
+        quality_controller=QualityController() if args.adaptive_quality else None,
     )
-
-    # Start keyboard listener in a separate thread
-    listener = keyboard.Listener(on_press=input_handler.on_press)
-    listener.start()
     
     try:
-        await client.connect()
+        if args.dsp:
+            with timer.phase("dsp stage"):
+                from utils import DSPStage
+
+                dsp_stage = DSPStage()
+                dsp_stage.start()
+
+        if broadcaster:
+            sinks = await start_sinks(broadcaster)
+
+        # Open the audio devices and the keyboard while the WebSocket handshake and session.update are in flight
+        audio_result, listener_result, connect_result = await asyncio.gather(
+            asyncio.to_thread(open_audio, timer, dsp_stage),
+            asyncio.to_thread(start_keyboard, timer, input_handler),
+            connect(timer, client),
+            return_exceptions=True
+        )
+        if not isinstance(audio_result, BaseException):
+            audio_handler = audio_result
+        if not isinstance(listener_result, BaseException):
+            listener = listener_result
+        for result in (audio_result, listener_result, connect_result):
+            if isinstance(result, BaseException):
+                raise result
+
         message_handler = asyncio.create_task(client.handle_messages())
+        # The connection is gone, tell the user without needing it
+        message_handler.add_done_callback(lambda _: play_prompt("connection_lost"))
         
         logger.info("Connected to OpenAI Realtime API!")
         logger.info("Audio streaming will start automatically.")
@@ -49,6 +188,7 @@ async def main():
         
         # Start continuous audio streaming
         streaming_task = asyncio.create_task(audio_handler.start_streaming(client))
+        timer.report("ready to listen")
         
         # Simple input loop for quit command
         while True:
@@ -59,11 +199,26 @@ async def main():
             
     except Exception as e:
         logger.error(f"Error: {e}")
+        # Let the notice play before the audio is closed
+        await asyncio.sleep(play_prompt("connection_lost" if isinstance(e, OSError) else "error"))
     finally:
-        audio_handler.stop_streaming()
-        audio_handler.cleanup()
+        quitting = True
+        if audio_handler:
+            audio_handler.stop_streaming()
+            audio_handler.cleanup()
+        if listener:
+            listener.stop()
+        tool_runtime.shutdown()
+        if dsp_stage:
+            dsp_stage.close()
+        if transcript_sink:
+            transcript_sink.close()
+        if broadcaster:
+            broadcaster.close()
+            for sink in sinks:
+                await sink.close()
         await client.close()
 
 if __name__ == "__main__":
     logger.info("Starting Realtime API CLI with Server VAD...")
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+import asyncio
+
+from utils.scheduler import AdmissionScheduler
+
+
+def rate_limits(requests_remaining, requests_reset, tokens_reset):
+    return [
+        {"name": "requests", "limit": 100, "remaining": requests_remaining, "reset_seconds": requests_reset},
+        {"name": "tokens", "limit": 100000, "remaining": 100000, "reset_seconds": tokens_reset},
+    ]
+
+
+def test_waits_for_the_exhausted_limit_without_spinning():
+    async def run():
+        scheduler = AdmissionScheduler()
+        dispatches = 0
+        dispatch = scheduler._dispatch
+
+        def counting_dispatch():
+            nonlocal dispatches
+            dispatches += 1
+            dispatch()
+
+        scheduler._dispatch = counting_dispatch
+        scheduler.update(rate_limits(1, 3, 0.2))
+        acquire = asyncio.ensure_future(scheduler.acquire("session"))
+        await asyncio.sleep(1.0)
+
+        assert not acquire.done()
+        # The queued acquire and the update, the tokens window resetting every 0.2 s must not wake it up
+        assert dispatches <= 3
+        acquire.cancel()
+
+    asyncio.run(run())
+
+
+def test_admits_once_the_exhausted_limit_resets():
+    async def run():
+        scheduler = AdmissionScheduler()
+        scheduler.update(rate_limits(1, 0.3, 0.1))
+        waited = await asyncio.wait_for(scheduler.acquire("session"), timeout=2)
+        assert 0.25 <= waited < 1.0
+
+    asyncio.run(run())
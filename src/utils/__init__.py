@@ -1,6 +1,40 @@
-from .audio import AudioHandler
-from .realtime_client import RealtimeClient, TurnDetectionMode
-from .input import InputHandler
+import importlib
+
+# Cheap, and has to be bound eagerly because it shares its name with its submodule
 from .logger import logger
 
-__all__ = ["AudioHandler", "RealtimeClient", "TurnDetectionMode", "InputHandler", "logger"]
\ No newline at end of file
+# Submodules are imported on first access, so entry points only pay for the heavy dependencies they use
+_exports = {
+    "AudioHandler": ".audio",
+    "RealtimeClient": ".realtime_client",
+    "TurnDetectionMode": ".realtime_client",
+    "InputHandler": ".input",
+    "EndpointDetector": ".endpoint",
+    "EndpointEvent": ".endpoint",
+    "ToolRuntime": ".tools",
+    "TrafficRulesIndex": ".traffic_rules",
+    "DSPStage": ".dsp",
+    "StartupTimer": ".timing",
+    "AdmissionScheduler": ".scheduler",
+    "Priority": ".scheduler",
+    "TranscriptSink": ".transcripts",
+    "BufferTuner": ".buffer_tuning",
+    "AudioBroadcaster": ".sinks",
+    "HTTPAudioSink": ".sinks",
+    "UnixSocketAudioSink": ".sinks",
+    "WavFileSink": ".sinks",
+    "RecordingBuffer": ".recording",
+    "LinkMonitor": ".network",
+    "QualityController": ".network",
+    "QualityLevel": ".network",
+    "PromptStore": ".prompts",
+}
+
+__all__ = list(_exports) + ["logger"]
+
+
+def __getattr__(name):
+    if name in _exports:
+        module = importlib.import_module(_exports[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
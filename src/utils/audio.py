@@ -1,14 +1,15 @@
-import asyncio
 import pyaudio
-import wave
-import queue
-import io
+import time
 from typing import Optional
 
-from pydub import AudioSegment
 import threading
 
 from .realtime_client import RealtimeClient
+from .ring_buffer import RingBuffer
+from .buffer_tuning import BufferTuner
+from .recording import RecordingBuffer
+from .audio_formats import wav_header
+from .prompts import PromptStore
 from .logger import logger
 
 
@@ -17,23 +18,35 @@ class AudioHandler:
     Handles audio input and output for the chatbot.
     Uses PyAudio for audio input and output, and runs a separate thread for recording and playing audio.
     When playing audio, it uses a buffer to store audio data and plays it continuously to ensure smooth playback.
+    Streamed capture and playback pass audio through preallocated ring buffers instead of per-chunk queue items.
+    With a BufferTuner the device buffer sizes are tuned from the measured overflows and underruns instead of
+    using the fixed chunk size.
 
     Attributes:
     format (int): The audio format (paInt16).
     channels (int): The number of audio channels (1).
     rate (int): The sample rate (24000).
-    chunk (int): The size of the audio buffer (1024).
+    chunk (int): The size of the audio buffer (1024), used when there is no buffer tuner.
+    buffer_tuner (BufferTuner): Picks the device buffer sizes, None for the fixed chunk size.
     audio (pyaudio.PyAudio): The PyAudio object.
     recording_stream (pyaudio.Stream): The stream for recording audio.
     recording_thread (threading.Thread): The thread for recording audio.
     recording (bool): Whether the audio is currently being recorded.
+    recording_buffer (RecordingBuffer): The last recording, kept in memory up to a limit and on disk beyond it.
     streaming (bool): Whether the audio is currently being streamed.
     stream (pyaudio.Stream): The stream for streaming audio.
+    capture_buffer (RingBuffer): The buffer between the capture thread and the event loop when streaming.
     playback_stream (pyaudio.Stream): The stream for playing audio.
-    playback_buffer (queue.Queue): The buffer for playing audio.
+    playback_buffer (RingBuffer): The buffer for playing audio.
     stop_playback (bool): Whether the audio playback should be stopped.
+    prompt_store (PromptStore): Pre-rendered fixed phrases, played without asking the API.
     """
-    def __init__(self):
+    def __init__(
+        self,
+        capture_buffer: Optional[RingBuffer] = None,
+        buffer_tuner: Optional[BufferTuner] = None,
+        prompt_store: Optional[PromptStore] = None
+    ):
         # Audio parameters
         self.format = pyaudio.paInt16
         self.channels = 1
@@ -41,22 +54,52 @@ class AudioHandler:
         self.chunk = 1024
 
         self.audio = pyaudio.PyAudio()
+        self.buffer_tuner = buffer_tuner
+        self.devices = {}
 
         # Recording params
         self.recording_stream: Optional[pyaudio.Stream] = None
         self.recording_thread = None
         self.recording = False
+        self.recording_buffer: Optional[RecordingBuffer] = None
 
         # streaming params
         self.streaming = False
         self.stream = None
+        self.stream_frames = self.chunk
+        self.capture_thread = None
+        # 10 seconds of audio, can be replaced by anything with the same interface, e.g. a DSPStage
+        self.capture_buffer = capture_buffer or RingBuffer(self.rate * 2 * 10)
 
         # Playback params
         self.playback_stream = None
-        self.playback_buffer = queue.Queue(maxsize=1024)
+        # 60 seconds of audio
+        self.playback_buffer = RingBuffer(self.rate * 2 * 60)
         self.playback_event = threading.Event()
         self.playback_thread = None
         self.stop_playback = False
+        # Audio written before this position was interrupted, the playback thread skips it
+        self._discard_to = 0
+        self.prompt_store = prompt_store
+
+    def _device_name(self, kind: str) -> str:
+        """The name of the default input or output device, the key of the tuned buffer sizes."""
+        if kind not in self.devices:
+            try:
+                if kind == "input":
+                    info = self.audio.get_default_input_device_info()
+                else:
+                    info = self.audio.get_default_output_device_info()
+                self.devices[kind] = info["name"]
+            except OSError:
+                self.devices[kind] = "default"
+        return self.devices[kind]
+
+    def _frames_per_buffer(self, kind: str) -> int:
+        """The device buffer size for the "input" or "output" stream."""
+        if self.buffer_tuner is None:
+            return self.chunk
+        return self.buffer_tuner.frames(kind, self._device_name(kind))
 
     def start_recording(self) -> bytes:
         """Start recording audio from microphone and return bytes"""
@@ -64,17 +107,19 @@ class AudioHandler:
             return b''
         
         self.recording = True
+        self.recording_frames = self._frames_per_buffer("input")
         self.recording_stream = self.audio.open(
             format=self.format,
             channels=self.channels,
             rate=self.rate,
             input=True,
-            frames_per_buffer=self.chunk
+            frames_per_buffer=self.recording_frames
         )
         
         logger.info("Recording...")
         
-        self.frames = []
+        # The WAV header is filled in once the length is known
+        self.recording_buffer = RecordingBuffer(header_size=len(wav_header("pcm16", 0)))
         self.recording_thread = threading.Thread(target=self._record)
         self.recording_thread.start()
         
@@ -83,16 +128,16 @@ class AudioHandler:
     def _record(self):
         while self.recording:
             try:
-                data = self.recording_stream.read(self.chunk)
-                self.frames.append(data)
+                data = self.recording_stream.read(self.recording_frames)
+                self.recording_buffer.write(data)
             except Exception as e:
                 logger.error(f"Error recording: {e}")
                 break
 
-    def stop_recording(self) -> bytes:
-        """Stop recording and return the recorded audio as bytes"""
+    def stop_recording(self) -> memoryview:
+        """Stop recording and return the recorded audio as a WAV file, a read-only view of the recording buffer"""
         if not self.recording:
-            return b''
+            return memoryview(b'')
         
         self.recording = False
         if self.recording_thread:
@@ -104,17 +149,20 @@ class AudioHandler:
             self.recording_stream.close()
             self.recording_stream = None
         
-        # Convert frames to WAV format in memory
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, 'wb') as wf:
-            wf.setnchannels(self.channels)
-            wf.setsampwidth(self.audio.get_sample_size(self.format))
-            wf.setframerate(self.rate)
-            wf.writeframes(b''.join(self.frames))
-        
-        # Get the WAV data
-        wav_buffer.seek(0)
-        return wav_buffer.read()
+        # PCM16 mono at 24 kHz, the header is written in front of the audio instead of copying it into a WAV file
+        return self.recording_buffer.finish(wav_header("pcm16", self.recording_buffer.size))
+
+    def open_input_stream(self):
+        """Open the microphone ahead of start_streaming, so it can be done while other startup work runs."""
+        if self.stream is None:
+            self.stream_frames = self._frames_per_buffer("input")
+            self.stream = self.audio.open(
+                format=self.format,
+                channels=self.channels,
+                rate=self.rate,
+                input=True,
+                frames_per_buffer=self.stream_frames
+            )
 
     async def start_streaming(self, client: RealtimeClient):
         """Start continuous audio streaming."""
@@ -122,30 +170,66 @@ class AudioHandler:
             return
         
         self.streaming = True
-        self.stream = self.audio.open(
-            format=self.format,
-            channels=self.channels,
-            rate=self.rate,
-            input=True,
-            frames_per_buffer=self.chunk
-        )
+        self.open_input_stream()
         
         logger.info("Streaming audio...")
+
+        self.capture_buffer.clear()
+        self.capture_thread = threading.Thread(target=self._capture, daemon=True)
+        self.capture_thread.start()
         
         while self.streaming:
             try:
-                # Read raw PCM data
-                data = self.stream.read(self.chunk, exception_on_overflow=False)
-                # Stream directly without trying to decode
-                await client.stream_audio(data)
+                await self.capture_buffer.wait_async()
+                if not self.streaming:
+                    break
+                # Send everything captured since the last wakeup in one message
+                data = self.capture_buffer.read()
+                if data:
+                    await client.stream_audio(data)
             except Exception as e:
                 logger.error(f"Error streaming: {e}")
                 break
-            await asyncio.sleep(0.01)
+
+    def _capture(self):
+        """Read from the input device into the capture buffer, so the event loop never blocks on the device."""
+        while self.streaming:
+            try:
+                if self.buffer_tuner:
+                    self._check_capture()
+                # Read raw PCM data
+                data = self.stream.read(self.stream_frames, exception_on_overflow=False)
+                if self.capture_buffer.write(data) < len(data):
+                    logger.warning("Capture buffer full, dropping audio")
+            except Exception as e:
+                if self.streaming:
+                    logger.error(f"Error capturing: {e}")
+                break
+
+    def _check_capture(self):
+        """
+        Report the state of the input stream to the buffer tuner and reopen the stream when the size changes.
+        More than two buffers waiting to be read means the thread does not keep up and the device will overflow.
+        """
+        device = self._device_name("input")
+        if self.stream.get_read_available() > 2 * self.stream_frames:
+            self.buffer_tuner.record_xrun("input", device, "overflow")
+        else:
+            self.buffer_tuner.record_ok("input", device)
+
+        if self.buffer_tuner.frames("input", device) != self.stream_frames:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+            self.open_input_stream()
 
     def stop_streaming(self):
         """Stop audio streaming."""
         self.streaming = False
+        if self.capture_thread:
+            self.capture_thread.join()
+            self.capture_thread = None
+        self.capture_buffer.notify()
         if self.stream:
             self.stream.stop_stream()
             self.stream.close()
@@ -153,12 +237,8 @@ class AudioHandler:
 
     def play_audio(self, audio_data: bytes):
         """Add audio data to the buffer"""
-        try:
-            self.playback_buffer.put_nowait(audio_data)
-        except queue.Full:
-            # If the buffer is full, remove the oldest chunk and add the new one
-            self.playback_buffer.get_nowait()
-            self.playback_buffer.put_nowait(audio_data)
+        if self.playback_buffer.write(audio_data) < len(audio_data):
+            logger.warning("Playback buffer full, dropping audio")
         
         if not self.playback_thread or not self.playback_thread.is_alive():
             self.stop_playback = False
@@ -166,58 +246,87 @@ class AudioHandler:
             self.playback_thread = threading.Thread(target=self._continuous_playback)
             self.playback_thread.start()
 
-    def _continuous_playback(self):
-        """Continuously play audio from the buffer"""
+    def _open_playback_stream(self) -> memoryview:
+        """Open the output stream and return the write buffer matching its size."""
+        self.playback_frames = self._frames_per_buffer("output")
         self.playback_stream = self.audio.open(
             format=self.format,
             channels=self.channels,
             rate=self.rate,
             output=True,
-            frames_per_buffer=self.chunk
+            frames_per_buffer=self.playback_frames
         )
+        # Reused for every write, audio is copied straight from the ring buffer into it
+        return memoryview(bytearray(self.playback_frames * self.channels * self.audio.get_sample_size(self.format)))
+
+    def play_prompt(self, phrase_id: str, voice: Optional[str] = None) -> float:
+        """Play a pre-rendered phrase. Returns its duration in seconds, 0 when there is no such phrase."""
+        audio = self.prompt_store.get(phrase_id, voice) if self.prompt_store else None
+        if audio is None:
+            logger.debug(f"No pre-rendered audio for {phrase_id}")
+            return 0.0
+        self.play_audio(audio)
+        return len(audio) / (self.rate * self.channels * self.audio.get_sample_size(self.format))
+
+    def _continuous_playback(self):
+        """Continuously play audio from the buffer"""
+        write_buffer = self._open_playback_stream()
 
         while not self.stop_playback:
-            try:
-                audio_chunk = self.playback_buffer.get(timeout=0.1)
-                self._play_audio_chunk(audio_chunk)
-            except queue.Empty:
+            self.playback_buffer.discard_until(self._discard_to)
+            if not self.playback_buffer.wait(timeout=0.1):
                 continue
+
+            self._play_audio_chunk(write_buffer)
             
             if self.playback_event.is_set():
                 break
 
+            if self.buffer_tuner and self._frames_per_buffer("output") != self.playback_frames:
+                self.playback_stream.stop_stream()
+                self.playback_stream.close()
+                write_buffer = self._open_playback_stream()
+
+        # Only this thread reads the buffer, so it drops the interrupted audio itself
+        self.playback_buffer.discard_until(self._discard_to)
         if self.playback_stream:
             self.playback_stream.stop_stream()
             self.playback_stream.close()
             self.playback_stream = None
 
-    def _play_audio_chunk(self, audio_chunk):
+    def _play_audio_chunk(self, write_buffer: memoryview):
+        """Play everything buffered, in small portions to allow for quicker interruption."""
         try:
-            # Convert the audio chunk to the correct format
-            audio_segment = AudioSegment(
-                audio_chunk,
-                sample_width=2,
-                frame_rate=24000,
-                channels=1
-            )
-            
-            # Ensure the audio is in the correct format for playback
-            audio_data = audio_segment.raw_data
-            
-            # Play the audio chunk in smaller portions to allow for quicker interruption
-            chunk_size = 1024  # Adjust this value as needed
-            for i in range(0, len(audio_data), chunk_size):
-                if self.playback_event.is_set():
+            # The API already sends PCM16 mono at 24 kHz, so the data is written as is
+            # PyAudio only accepts read-only buffers
+            readonly_buffer = write_buffer.toreadonly()
+            bytes_per_second = self.rate * self.channels * self.audio.get_sample_size(self.format)
+            started = time.perf_counter()
+            written = 0.0
+            while self.playback_buffer.available and not self.playback_event.is_set():
+                n = self.playback_buffer.read_into(write_buffer)
+                if self.buffer_tuner:
+                    # The device has played for as long as the writes have been running, if that is more than
+                    # what was written plus the device latency, it ran out of audio in between
+                    if time.perf_counter() - started > written + self.playback_stream.get_output_latency():
+                        self.buffer_tuner.record_xrun("output", self._device_name("output"), "underrun")
+                        started = time.perf_counter()
+                        written = 0.0
+                    else:
+                        self.buffer_tuner.record_ok("output", self._device_name("output"))
+                self.playback_stream.write(readonly_buffer[:n])
+                written += n / bytes_per_second
+                if self.buffer_tuner and self._frames_per_buffer("output") != self.playback_frames:
+                    # Let _continuous_playback reopen the stream with the new size
                     break
-                chunk = audio_data[i:i+chunk_size]
-                self.playback_stream.write(chunk)
         except Exception as e:
             logger.error(f"Error playing audio chunk: {e}")
 
     def stop_playback_immediately(self):
         """Stop audio playback immediately."""
         self.stop_playback = True
-        self.playback_buffer.queue.clear()  # Clear any pending audio
+        # Pending audio is dropped by the playback thread, clearing here would race with its reads
+        self._discard_to = self.playback_buffer.write_position
         self.currently_playing = False
         self.playback_event.set()
 
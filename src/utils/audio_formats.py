@@ -0,0 +1,23 @@
+import struct
+
+# Sample rate, bytes per sample and WAV format tag of the input and output audio formats of the Realtime API
+AUDIO_FORMATS = {
+    "pcm16": {"rate": 24000, "sample_width": 2, "wav_tag": 1},
+    "g711_ulaw": {"rate": 8000, "sample_width": 1, "wav_tag": 7},
+    "g711_alaw": {"rate": 8000, "sample_width": 1, "wav_tag": 6},
+}
+
+
+def wav_header(audio_format: str, data_size: int = 0xFFFFFFFF - 36) -> bytes:
+    """
+    A WAV header for mono audio in the given format, the audio itself follows unchanged.
+    The default data size marks a stream of unknown length.
+    """
+    info = AUDIO_FORMATS[audio_format]
+    byte_rate = info["rate"] * info["sample_width"]
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, info["wav_tag"], 1, info["rate"], byte_rate, info["sample_width"], info["sample_width"] * 8,
+        b"data", data_size
+    )
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+
+from collections import deque
+from typing import Dict, Any
+
+from .logger import logger
+
+DEFAULT_SETTINGS_PATH = os.path.join(os.path.expanduser("~"), ".car-lector", "audio_buffers.json")
+
+
+class BufferTuner:
+    """
+    Picks frames_per_buffer for the capture and playback streams of each device.
+    Starts with the smallest buffer within the latency bounds and doubles it whenever overflows, underruns or late
+    reads pile up, then tries to halve it again after a long stable period, but never back to a size that already
+    failed on the device. The chosen sizes are saved per device and reused on the next start.
+
+    Attributes:
+    rate (int): The sample rate of the streams.
+    min_frames (int): The smallest buffer allowed by min_latency_ms.
+    max_frames (int): The largest buffer allowed by max_latency_ms.
+    xrun_limit (int): How many problems within xrun_window seconds make the buffer grow.
+    shrink_after (float): How many seconds without problems make the buffer shrink.
+    path (str): The JSON file with the saved sizes.
+    """
+    SIZES = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+    def __init__(
+        self,
+        rate: int = 24000,
+        min_latency_ms: float = 5.0,
+        max_latency_ms: float = 200.0,
+        xrun_limit: int = 2,
+        xrun_window: float = 10.0,
+        shrink_after: float = 120.0,
+        path: str = DEFAULT_SETTINGS_PATH
+    ):
+        self.rate = rate
+        allowed = [size for size in self.SIZES if min_latency_ms <= size * 1000 / rate <= max_latency_ms]
+        if not allowed:
+            raise ValueError(f"No buffer size fits between {min_latency_ms} and {max_latency_ms} ms")
+        self.sizes = allowed
+        self.min_frames = allowed[0]
+        self.max_frames = allowed[-1]
+        self.xrun_limit = xrun_limit
+        self.xrun_window = xrun_window
+        self.shrink_after = shrink_after
+        self.path = path
+
+        self.saved = self._load()
+        self._state: Dict[str, Dict[str, Any]] = {}
+        # The capture and playback threads report concurrently and both may save
+        self._lock = threading.Lock()
+
+    def frames(self, kind: str, device: str) -> int:
+        """The current frames_per_buffer for the "input" or "output" stream of a device."""
+        with self._lock:
+            return self._get_state(kind, device)["frames"]
+
+    def record_xrun(self, kind: str, device: str, reason: str) -> None:
+        """Report an overflow, underrun or late read."""
+        with self._lock:
+            state = self._get_state(kind, device)
+            now = time.monotonic()
+            state["xruns"].append(now)
+            state["stable_since"] = now
+            while state["xruns"] and now - state["xruns"][0] > self.xrun_window:
+                state["xruns"].popleft()
+
+            logger.debug(f"Audio {kind} {reason} on {device} with {state['frames']} frames")
+            if len(state["xruns"]) >= self.xrun_limit:
+                self._resize(kind, device, state, +1, reason)
+
+    def record_ok(self, kind: str, device: str) -> None:
+        """Report a buffer handled without problems, used to shrink after a stable period."""
+        with self._lock:
+            state = self._get_state(kind, device)
+            if time.monotonic() - state["stable_since"] <= self.shrink_after:
+                return
+            index = self.sizes.index(state["frames"])
+            # Never go back to a size that already failed on this device, it would only fail again
+            if index > 0 and self.sizes[index - 1] > state["failed"]:
+                self._resize(kind, device, state, -1, "stable")
+
+    def _get_state(self, kind: str, device: str) -> Dict[str, Any]:
+        key = f"{kind}:{device}"
+        state = self._state.get(key)
+        if state is None:
+            frames = self.saved.get(key, self.min_frames)
+            frames = min(self.sizes, key=lambda size: abs(size - frames))
+            state = self._state[key] = {"frames": frames, "xruns": deque(), "stable_since": time.monotonic(), "failed": 0}
+        return state
+
+    def _resize(self, kind: str, device: str, state: Dict[str, Any], direction: int, reason: str) -> None:
+        index = self.sizes.index(state["frames"]) + direction
+        state["xruns"].clear()
+        state["stable_since"] = time.monotonic()
+        if not 0 <= index < len(self.sizes):
+            return
+
+        old_frames, state["frames"] = state["frames"], self.sizes[index]
+        if direction > 0:
+            state["failed"] = max(state["failed"], old_frames)
+        logger.info(
+            f"Audio {kind} buffer on {device}: {old_frames} -> {state['frames']} frames "
+            f"({state['frames'] * 1000 / self.rate:.1f} ms, {reason})"
+        )
+        self.saved[f"{kind}:{device}"] = state["frames"]
+        self._save()
+
+    def _load(self) -> Dict[str, int]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        # Called with the lock held, so the file is written by one thread at a time from a consistent dict
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.saved, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Error saving audio buffer settings: {e}")
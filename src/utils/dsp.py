@@ -0,0 +1,295 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+import numpy as np
+
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Optional, Dict, Any
+
+from .ring_buffer import RingBuffer, SharedRingBuffer
+from .logger import logger
+
+
+class DSPProcessor:
+    """
+    Vectorized clean-up of microphone audio: resampling, noise suppression and automatic gain control.
+    Works on blocks of PCM16 samples of any length and keeps the state needed to join the blocks seamlessly.
+
+    Noise suppression is a spectral subtraction with a minimum tracking noise estimate, done with 50% overlapping
+    square-root Hann windows so the blocks add back up without artifacts. It delays the audio by fft_size - hop samples.
+    AGC only adapts to blocks clearly above the background level, so pauses are not pumped up to speech level.
+
+    Attributes:
+    rate (int): The output sample rate (24000).
+    input_rate (int): The sample rate of the incoming audio, resampled linearly to rate when different.
+    noise_suppression (bool): Whether noise suppression is enabled.
+    agc (bool): Whether automatic gain control is enabled.
+    target_db (float): The level AGC aims for, in dB relative to full scale.
+    max_gain_db (float): The largest gain AGC is allowed to apply.
+    """
+    def __init__(
+        self,
+        rate: int = 24000,
+        input_rate: Optional[int] = None,
+        noise_suppression: bool = True,
+        agc: bool = True,
+        fft_size: int = 512,
+        over_subtraction: float = 1.5,
+        gain_floor: float = 0.1,
+        noise_growth: float = 1.002,
+        noise_bias: float = 2.0,
+        target_db: float = -20.0,
+        max_gain_db: float = 20.0,
+        silence_db: float = -55.0,
+        speech_margin_db: float = 10.0,
+        attack: float = 0.5,
+        release: float = 0.05
+    ):
+        self.rate = rate
+        self.input_rate = input_rate or rate
+        self.noise_suppression = noise_suppression
+        self.agc = agc
+
+        # Noise suppression state
+        self.fft_size = fft_size
+        self.hop = fft_size // 2
+        self.over_subtraction = over_subtraction
+        self.gain_floor = gain_floor
+        self.noise_growth = noise_growth
+        self.noise_bias = noise_bias
+        self._window = np.sqrt(0.5 - 0.5 * np.cos(2 * np.pi * np.arange(fft_size) / fft_size)).astype(np.float32)
+        self._ns_input = np.zeros(0, dtype=np.float32)
+        self._ns_overlap = np.zeros(fft_size - self.hop, dtype=np.float32)
+        self._smoothed_power: Optional[np.ndarray] = None
+        self._noise: Optional[np.ndarray] = None
+
+        # AGC state
+        self.target_db = target_db
+        self.max_gain_db = max_gain_db
+        self.silence_db = silence_db
+        self.speech_margin_db = speech_margin_db
+        self._background_db: Optional[float] = None
+        self.attack = attack
+        self.release = release
+        self._agc_gain = 1.0
+
+        # Resampling state
+        self._rs_position = 0.0
+        self._rs_last = np.zeros(0, dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Process a block of int16 samples and return the int16 samples that are ready."""
+        x = samples.astype(np.float32) / 32768.0
+        if self.input_rate != self.rate:
+            x = self._resample(x)
+        if self.noise_suppression:
+            x = self._suppress_noise(x)
+        if self.agc and x.size:
+            x = self._apply_gain(x)
+        return (np.clip(x, -1.0, 32767 / 32768) * 32768.0).astype(np.int16)
+
+    def _resample(self, x: np.ndarray) -> np.ndarray:
+        buf = np.concatenate((self._rs_last, x))
+        step = self.input_rate / self.rate
+        positions = np.arange(self._rs_position, buf.size - 1, step)
+        out = np.interp(positions, np.arange(buf.size), buf).astype(np.float32)
+        # Carry the fractional position and the last sample over to the next block
+        next_position = positions[-1] + step if positions.size else self._rs_position
+        self._rs_position = next_position - (buf.size - 1)
+        self._rs_last = buf[-1:]
+        return out
+
+    def _suppress_noise(self, x: np.ndarray) -> np.ndarray:
+        buf = np.concatenate((self._ns_input, x))
+        if buf.size < self.fft_size:
+            self._ns_input = buf
+            return np.zeros(0, dtype=np.float32)
+
+        n_frames = (buf.size - self.fft_size) // self.hop + 1
+        frames = sliding_window_view(buf, self.fft_size)[::self.hop][:n_frames] * self._window
+        spectrum = np.fft.rfft(frames, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+
+        # The noise estimate follows minima of the smoothed power immediately and rises slowly otherwise.
+        # Minima sit below the mean noise power, noise_bias compensates for that.
+        block_power = power.mean(axis=0)
+        if self._noise is None:
+            self._smoothed_power = block_power
+            self._noise = block_power
+        else:
+            self._smoothed_power = 0.7 * self._smoothed_power + 0.3 * block_power
+            self._noise = np.minimum(self._noise * self.noise_growth ** n_frames, self._smoothed_power)
+
+        noise = self.noise_bias * self.over_subtraction * self._noise
+        gain = np.maximum(1.0 - noise / (power + 1e-12), self.gain_floor)
+        out_frames = np.fft.irfft(spectrum * gain, n=self.fft_size, axis=1).astype(np.float32) * self._window
+
+        # Overlap-add the frames onto the tail left over from the previous block
+        overlap_len = self.fft_size - self.hop
+        ola = np.zeros(n_frames * self.hop + overlap_len, dtype=np.float32)
+        ola[:overlap_len] += self._ns_overlap
+        for i in range(n_frames):
+            ola[i * self.hop:i * self.hop + self.fft_size] += out_frames[i]
+
+        self._ns_overlap = ola[n_frames * self.hop:]
+        self._ns_input = buf[n_frames * self.hop:]
+        return ola[:n_frames * self.hop]
+
+    def _apply_gain(self, x: np.ndarray) -> np.ndarray:
+        level_db = 10 * np.log10(np.mean(x * x) + 1e-12)
+        # Background level drops to quiet blocks immediately and creeps up otherwise
+        if self._background_db is None or level_db < self._background_db:
+            self._background_db = level_db
+        else:
+            self._background_db += 0.01 * (level_db - self._background_db)
+
+        if level_db > max(self.silence_db, self._background_db + self.speech_margin_db):
+            desired = 10 ** (min(self.target_db - level_db, self.max_gain_db) / 20)
+            # React fast when getting louder, slowly when getting quieter
+            rate = self.attack if desired < self._agc_gain else self.release
+            new_gain = self._agc_gain + (desired - self._agc_gain) * rate
+        else:
+            new_gain = self._agc_gain
+
+        # Ramp the gain over the block to avoid steps
+        ramp = np.linspace(self._agc_gain, new_gain, x.size, dtype=np.float32)
+        self._agc_gain = new_gain
+        return x * ramp
+
+
+def _dsp_worker(input_name, output_name, capacity, input_event, output_event, stop_event, stats, config):
+    """Entry point of the DSP process."""
+    # Ctrl+C is handled by the parent, which stops this process through stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    input_ring = SharedRingBuffer(capacity, name=input_name, data_event=input_event)
+    output_ring = SharedRingBuffer(capacity, name=output_name, data_event=output_event)
+    processor = DSPProcessor(**config)
+    block = bytearray(DSPStage.BLOCK_BYTES)
+
+    try:
+        while not stop_event.is_set():
+            if not input_ring.wait(timeout=0.1):
+                continue
+            n = input_ring.read_into(block)
+
+            start = time.perf_counter()
+            out = processor.process(np.frombuffer(block, dtype=np.int16, count=n // 2))
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            if out.size:
+                output_ring.write(out.view(np.uint8))
+            stats[0] += 1
+            stats[1] += elapsed_ms
+            stats[2] = max(stats[2], elapsed_ms)
+            stats[3] = elapsed_ms
+    finally:
+        input_ring.close()
+        output_ring.close()
+
+
+class DSPStage:
+    """
+    Runs DSPProcessor in a separate process so the NumPy work adds no jitter to the capture thread or the event loop.
+    Raw audio goes to the process and processed audio comes back over shared memory rings.
+
+    The stage has the same producer/consumer interface as RingBuffer, so it can be handed to AudioHandler
+    as its capture buffer in place of a plain ring.
+
+    Attributes:
+    config (Dict[str, Any]): Keyword arguments for the DSPProcessor in the child process.
+    process (multiprocessing.Process): The DSP process.
+    """
+    BLOCK_BYTES = 4096
+
+    def __init__(self, capacity: int = 24000 * 2 * 10, **config):
+        self.capacity = capacity
+        self.config = config
+        self.process = None
+
+        ctx = multiprocessing.get_context("spawn")
+        self._input = SharedRingBuffer(capacity, data_event=ctx.Event())
+        self._output = SharedRingBuffer(capacity, data_event=ctx.Event())
+        # Processed audio is moved into a local ring, which the event loop can await
+        self._local = RingBuffer(capacity)
+        self._stop_event = ctx.Event()
+        # blocks, total ms, max ms, last ms
+        self._stats = ctx.Array("d", 4, lock=False)
+        self._ctx = ctx
+        self._relay_thread = None
+
+    def start(self) -> None:
+        """Start the DSP process."""
+        self.process = self._ctx.Process(
+            target=_dsp_worker,
+            args=(
+                self._input.name, self._output.name, self.capacity,
+                self._input.data_event, self._output.data_event,
+                self._stop_event, self._stats, self.config
+            ),
+            daemon=True
+        )
+        self.process.start()
+        self._relay_thread = threading.Thread(target=self._relay, daemon=True)
+        self._relay_thread.start()
+        logger.info("DSP stage started")
+
+    def _relay(self):
+        scratch = bytearray(self.BLOCK_BYTES)
+        while not self._stop_event.is_set():
+            if not self._output.wait(timeout=0.1):
+                continue
+            n = self._output.read_into(scratch)
+            if self._local.write(memoryview(scratch)[:n]) < n:
+                logger.warning("DSP output buffer full, dropping audio")
+
+    # Producer side
+    def write(self, data) -> int:
+        return self._input.write(data)
+
+    # Consumer side
+    @property
+    def available(self) -> int:
+        return self._local.available
+
+    def read(self, size: Optional[int] = None) -> bytes:
+        return self._local.read(size)
+
+    def read_into(self, out) -> int:
+        return self._local.read_into(out)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._local.wait(timeout)
+
+    async def wait_async(self) -> None:
+        await self._local.wait_async()
+
+    def notify(self) -> None:
+        self._local.notify()
+
+    def clear(self) -> None:
+        self._local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-block processing time of the DSP process."""
+        blocks = int(self._stats[0])
+        return {
+            "blocks": blocks,
+            "avg_ms": self._stats[1] / blocks if blocks else 0.0,
+            "max_ms": self._stats[2],
+            "last_ms": self._stats[3]
+        }
+
+    def close(self) -> None:
+        """Stop the DSP process and free the shared memory."""
+        self._stop_event.set()
+        if self.process:
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.terminate()
+        if self._relay_thread:
+            self._relay_thread.join()
+        self._input.close()
+        self._output.close()
+        logger.info(f"DSP stage stopped: {self.stats()}")
@@ -0,0 +1,98 @@
+import numpy as np
+
+from typing import List
+from enum import Enum
+
+
+class EndpointEvent(Enum):
+    SPEECH_STARTED = "speech_started"
+    END_OF_TURN = "end_of_turn"
+
+
+class EndpointDetector:
+    """
+    Lightweight energy based end-of-turn detector for the capture stream.
+    Splits incoming PCM16 chunks into short frames, compares their energy against an adaptive noise floor
+    and reports when the speaker starts talking and when the turn is most likely finished.
+
+    Attributes:
+    rate (int): The sample rate of the incoming audio (24000).
+    frame_ms (int): The analysis frame length in milliseconds.
+    margin_db (float): How far above the noise floor a frame must be to count as speech.
+    min_level_db (float): Absolute level below which a frame is never treated as speech.
+    min_speech_ms (int): How much speech is needed before a turn is considered started.
+    silence_duration_ms (int): How much trailing silence ends the turn.
+    noise_floor_db (float): The current noise floor estimate.
+    in_speech (bool): Whether the speaker is currently talking.
+    """
+    def __init__(
+        self,
+        rate: int = 24000,
+        frame_ms: int = 10,
+        margin_db: float = 12.0,
+        min_level_db: float = 35.0,
+        min_speech_ms: int = 120,
+        silence_duration_ms: int = 300,
+        noise_adapt: float = 0.05
+    ):
+        self.rate = rate
+        self.frame_ms = frame_ms
+        self.frame_len = rate * frame_ms // 1000
+        self.margin_db = margin_db
+        self.min_level_db = min_level_db
+        self.min_speech_ms = min_speech_ms
+        self.silence_duration_ms = silence_duration_ms
+        self.noise_adapt = noise_adapt
+
+        self.noise_floor_db = min_level_db
+        self.in_speech = False
+        self._speech_ms = 0
+        self._silence_ms = 0
+        self._remainder = np.zeros(0, dtype=np.int16)
+
+    def reset(self) -> None:
+        """Forget the current turn, keep the noise floor estimate."""
+        self.in_speech = False
+        self._speech_ms = 0
+        self._silence_ms = 0
+        self._remainder = np.zeros(0, dtype=np.int16)
+
+    def frame_levels(self, audio_chunk: bytes) -> np.ndarray:
+        """Return the level in dB of every complete frame, carrying leftover samples to the next call."""
+        samples = np.frombuffer(audio_chunk, dtype=np.int16)
+        if self._remainder.size:
+            samples = np.concatenate((self._remainder, samples))
+
+        n_frames = samples.size // self.frame_len
+        self._remainder = samples[n_frames * self.frame_len:].copy()
+        if n_frames == 0:
+            return np.zeros(0)
+
+        frames = samples[:n_frames * self.frame_len].reshape(n_frames, self.frame_len).astype(np.float32)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        return 20.0 * np.log10(rms + 1.0)
+
+    def process(self, audio_chunk: bytes) -> List[EndpointEvent]:
+        """Feed a chunk of raw PCM16 audio and return the endpoint events it triggered."""
+        events = []
+        for level in self.frame_levels(audio_chunk):
+            is_speech = level > max(self.noise_floor_db + self.margin_db, self.min_level_db)
+
+            if is_speech:
+                self._speech_ms += self.frame_ms
+                self._silence_ms = 0
+                if not self.in_speech and self._speech_ms >= self.min_speech_ms:
+                    self.in_speech = True
+                    events.append(EndpointEvent.SPEECH_STARTED)
+            else:
+                # Only track the noise floor while nobody is talking
+                self.noise_floor_db += self.noise_adapt * (level - self.noise_floor_db)
+                self._silence_ms += self.frame_ms
+                if not self.in_speech:
+                    self._speech_ms = 0
+                elif self._silence_ms >= self.silence_duration_ms:
+                    self.in_speech = False
+                    self._speech_ms = 0
+                    events.append(EndpointEvent.END_OF_TURN)
+
+        return events
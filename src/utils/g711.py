@@ -0,0 +1,90 @@
+import numpy as np
+
+G711_RATE = 8000
+
+
+def ulaw_encode(samples: np.ndarray) -> np.ndarray:
+    """Encode int16 samples with G.711 mu-law, bit-exact with the ITU reference implementation."""
+    x = samples.astype(np.int32) >> 2
+    mask = np.where(x < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(x), 8158) + 0x21
+    segment = np.floor(np.log2(magnitude)).astype(np.int32) - 5
+    mantissa = (magnitude >> (segment + 1)) & 0x0F
+    return (((segment << 4) | mantissa) ^ mask).astype(np.uint8)
+
+
+def alaw_encode(samples: np.ndarray) -> np.ndarray:
+    """Encode int16 samples with G.711 A-law, bit-exact with the ITU reference implementation."""
+    x = samples.astype(np.int32) >> 3
+    mask = np.where(x >= 0, 0xD5, 0x55)
+    magnitude = np.where(x >= 0, x, -x - 1)
+    segment = np.maximum(np.floor(np.log2(np.maximum(magnitude, 1))).astype(np.int32) - 4, 0)
+    mantissa = np.where(segment < 2, magnitude >> 1, magnitude >> segment) & 0x0F
+    return (((segment << 4) | mantissa) ^ mask).astype(np.uint8)
+
+
+def _ulaw_table() -> np.ndarray:
+    u = ~np.arange(256) & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, 0x84 - t, t - 0x84).astype(np.int16)
+
+
+def _alaw_table() -> np.ndarray:
+    a = np.arange(256) ^ 0x55
+    segment = (a & 0x70) >> 4
+    t = (a & 0x0F) << 4
+    t = np.where(segment == 0, t + 8, (t + 0x108) << np.maximum(segment - 1, 0))
+    return np.where(a & 0x80, t, -t).astype(np.int16)
+
+
+_DECODE_TABLES = {"ulaw": _ulaw_table(), "alaw": _alaw_table()}
+
+
+def g711_decode(data: bytes, law: str = "ulaw", output_rate: int = 24000) -> bytes:
+    """Decode G.711 at 8 kHz into PCM16 at output_rate, interpolating linearly."""
+    samples = _DECODE_TABLES[law][np.frombuffer(data, dtype=np.uint8)]
+    if output_rate == G711_RATE or samples.size == 0:
+        return samples.tobytes()
+    n_out = samples.size * output_rate // G711_RATE
+    positions = np.arange(n_out) * (G711_RATE / output_rate)
+    return np.round(np.interp(positions, np.arange(samples.size), samples)).astype("<i2").tobytes()
+
+
+class G711Encoder:
+    """
+    Turns a stream of PCM16 chunks into G.711 at 8 kHz, for sending microphone audio over slow links.
+    The audio is low-pass filtered to the telephone band before decimation, the filter history and the samples
+    left over between chunks are kept, so chunks of any length join seamlessly.
+
+    Attributes:
+    law (str): "ulaw" or "alaw".
+    input_rate (int): The sample rate of the PCM16 input, a multiple of 8000.
+    """
+    def __init__(self, law: str = "ulaw", input_rate: int = 24000, taps: int = 48):
+        if input_rate % G711_RATE:
+            raise ValueError(f"The input rate must be a multiple of {G711_RATE}")
+        self.law = law
+        self.input_rate = input_rate
+        self._encode = ulaw_encode if law == "ulaw" else alaw_encode
+        self._factor = input_rate // G711_RATE
+
+        # Windowed sinc low-pass at 3.4 kHz
+        n = np.arange(taps) - (taps - 1) / 2
+        cutoff = 3400 / input_rate
+        self._filter = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+        self._filter /= self._filter.sum()
+        self._history = np.zeros(taps - 1)
+        self._phase = 0
+
+    def encode(self, pcm: bytes) -> bytes:
+        samples = np.frombuffer(pcm, dtype="<i2")
+        if self._factor == 1:
+            return self._encode(samples).tobytes()
+
+        x = np.concatenate((self._history, samples))
+        filtered = np.convolve(x, self._filter, mode="valid")
+        self._history = x[len(x) - len(self._history):]
+
+        decimated = filtered[self._phase::self._factor]
+        self._phase = (self._phase - len(filtered)) % self._factor
+        return self._encode(np.clip(np.round(decimated), -32768, 32767).astype(np.int16)).tobytes()
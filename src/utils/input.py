@@ -1,5 +1,4 @@
 import asyncio
-from pynput import keyboard
 
 class InputHandler:
     """
@@ -11,14 +10,28 @@ class InputHandler:
     text_ready (asyncio.Event): An event that is set when the user has finished typing.
     command_queue (asyncio.Queue): A queue that stores commands for the chatbot.
     loop (asyncio.AbstractEventLoop): The event loop for the input handler.
+
+    pynput is imported on first use, importing it connects to the display server and is slow.
     """
     def __init__(self):
         self.text_input = ""
         self.text_ready = asyncio.Event()
         self.command_queue = asyncio.Queue()
         self.loop = None
+        # The pynput keyboard module, set by start_listener
+        self._keyboard = None
+
+    def start_listener(self):
+        """Start listening to the keyboard in a separate thread and return the listener."""
+        from pynput import keyboard
+
+        self._keyboard = keyboard
+        listener = keyboard.Listener(on_press=self.on_press)
+        listener.start()
+        return listener
 
     def on_press(self, key):
+        keyboard = self._keyboard
         try:
             if key == keyboard.Key.space:
                 self.loop.call_soon_threadsafe(
@@ -0,0 +1,184 @@
+import asyncio
+import math
+import time
+
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any
+
+from .logger import logger
+
+
+class LinkMonitor:
+    """
+    Estimates the quality of the WebSocket link while a session runs.
+    The RTT is measured with WebSocket pings, which queue behind the audio already being sent, so it includes the
+    delay a new message would see. Uplink throughput is estimated from how fast the transport write buffer drains.
+
+    Attributes:
+    interval (float): Seconds between probes.
+    timeout (float): Seconds without a pong after which the probe counts as lost, its RTT is taken as timeout.
+    rtt (float): The smoothed round trip time in seconds, None before the first probe.
+    throughput (float): The smoothed uplink throughput in bytes per second, None while it is unknown.
+    backlog (int): Bytes waiting in the write buffer at the last probe.
+    lost (int): Probes that timed out.
+    """
+    def __init__(self, interval: float = 2.0, timeout: float = 5.0, smoothing: float = 0.3):
+        self.interval = interval
+        self.timeout = timeout
+        self.smoothing = smoothing
+        self.rtt: Optional[float] = None
+        self.throughput: Optional[float] = None
+        self.backlog = 0
+        self.lost = 0
+
+        self._sent = 0
+        self._last_sample: Optional[tuple] = None
+
+    def record_sent(self, n_bytes: int) -> None:
+        """Count bytes handed to the WebSocket, called for every audio message."""
+        self._sent += n_bytes
+
+    async def probe(self, ws) -> None:
+        """Send a ping, wait for the pong and sample the write buffer."""
+        start = time.perf_counter()
+        pong_waiter = await ws.ping()
+        try:
+            await asyncio.wait_for(pong_waiter, self.timeout)
+            rtt = time.perf_counter() - start
+        except asyncio.TimeoutError:
+            rtt = self.timeout
+            self.lost += 1
+        self.rtt = rtt if self.rtt is None else (1 - self.smoothing) * self.rtt + self.smoothing * rtt
+
+        transport = getattr(ws, "transport", None)
+        if transport is not None:
+            self._sample_buffer(transport.get_write_buffer_size())
+
+    def _sample_buffer(self, backlog: int) -> None:
+        now = time.perf_counter()
+        if self._last_sample is not None:
+            last_time, last_sent, last_backlog = self._last_sample
+            drained = (self._sent - last_sent) + (last_backlog - backlog)
+            rate = drained / (now - last_time)
+            # With an empty buffer the link kept up with what was offered, the rate is only a lower bound
+            saturated = backlog > 0 or last_backlog > 0
+            if saturated or self.throughput is None or rate > self.throughput:
+                self.throughput = rate if self.throughput is None else (1 - self.smoothing) * self.throughput + self.smoothing * rate
+        self._last_sample = (now, self._sent, backlog)
+        self.backlog = backlog
+
+    @property
+    def backlog_seconds(self) -> float:
+        """How long the queued data takes to send at the measured throughput."""
+        if not self.backlog:
+            return 0.0
+        if not self.throughput or self.throughput <= 0:
+            return math.inf
+        return self.backlog / self.throughput
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rtt_ms": self.rtt * 1000 if self.rtt is not None else None,
+            "throughput_kbps": self.throughput * 8 / 1000 if self.throughput is not None else None,
+            "backlog_bytes": self.backlog,
+            "backlog_ms": self.backlog_seconds * 1000,
+            "lost": self.lost
+        }
+
+
+@dataclass
+class QualityLevel:
+    name: str
+    input_audio_format: str
+    packet_ms: int
+    modalities: List[str]
+    # The worst link the level is used on
+    max_rtt: float = math.inf
+    max_backlog: float = math.inf
+
+
+DEFAULT_LEVELS = [
+    QualityLevel("full", "pcm16", 40, ["text", "audio"], max_rtt=0.3, max_backlog=0.3),
+    QualityLevel("reduced", "g711_ulaw", 200, ["text", "audio"], max_rtt=1.0, max_backlog=1.0),
+    QualityLevel("text only", "g711_ulaw", 500, ["text"]),
+]
+
+
+class QualityController:
+    """
+    Picks the upstream audio format, packet size and response modalities from the link quality.
+    On a worse link the microphone audio is sent as G.711 in larger packets, which needs a sixth of the bandwidth,
+    and on a poor link the assistant answers with text only. Going down is quick, going back up needs a longer
+    stretch of a clearly better link, so the session does not flip between levels.
+
+    Attributes:
+    monitor (LinkMonitor): The source of the link measurements.
+    levels (List[QualityLevel]): The levels from the best to the most robust.
+    level (QualityLevel): The current level.
+    downgrade_after (int): Consecutive probes below the current level needed to go down.
+    upgrade_after (int): Consecutive probes above the current level needed to go up.
+    upgrade_margin (float): The fraction of a better level's limits the link must stay within to go up.
+    decisions (List[Dict[str, Any]]): The level changes with the measurements that caused them.
+    """
+    def __init__(
+        self,
+        monitor: Optional[LinkMonitor] = None,
+        levels: Optional[List[QualityLevel]] = None,
+        downgrade_after: int = 2,
+        upgrade_after: int = 5,
+        upgrade_margin: float = 0.7
+    ):
+        self.monitor = monitor or LinkMonitor()
+        self.levels = levels or DEFAULT_LEVELS
+        self.level = self.levels[0]
+        self.downgrade_after = downgrade_after
+        self.upgrade_after = upgrade_after
+        self.upgrade_margin = upgrade_margin
+        self.decisions: List[Dict[str, Any]] = []
+
+        self._streak = 0
+        self._streak_direction = 0
+
+    def _fits(self, level: QualityLevel, margin: float = 1.0) -> bool:
+        return (
+            (self.monitor.rtt or 0.0) <= level.max_rtt * margin
+            and self.monitor.backlog_seconds <= level.max_backlog * margin
+        )
+
+    def evaluate(self) -> Optional[QualityLevel]:
+        """Take the latest measurements into account, returns the new level when it changes."""
+        index = self.levels.index(self.level)
+        if not self._fits(self.level):
+            direction = 1
+        elif index > 0 and self._fits(self.levels[index - 1], self.upgrade_margin):
+            direction = -1
+        else:
+            direction = 0
+
+        if direction != self._streak_direction:
+            self._streak = 0
+            self._streak_direction = direction
+        if direction == 0:
+            return None
+        self._streak += 1
+        if self._streak < (self.downgrade_after if direction > 0 else self.upgrade_after):
+            return None
+
+        if direction > 0:
+            # Skip straight to the first level the link can carry
+            target = next((i for i in range(index + 1, len(self.levels)) if self._fits(self.levels[i])), len(self.levels) - 1)
+        else:
+            target = index - 1
+        self._streak = 0
+        previous, self.level = self.level, self.levels[target]
+
+        stats = self.monitor.stats()
+        self.decisions.append({"time": time.time(), "from": previous.name, "to": self.level.name, **stats})
+        logger.info(
+            f"Link quality: {previous.name} -> {self.level.name} "
+            f"(RTT {stats['rtt_ms']:.0f} ms, backlog {stats['backlog_ms']:.0f} ms, "
+            f"throughput {stats['throughput_kbps'] or 0:.0f} kbit/s, lost pings {stats['lost']}), "
+            f"sending {self.level.input_audio_format} in {self.level.packet_ms} ms packets, "
+            f"modalities {'+'.join(self.level.modalities)}"
+        )
+        return self.level
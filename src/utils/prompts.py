@@ -0,0 +1,113 @@
+import json
+import mmap
+import os
+
+from typing import Optional, Dict
+
+from .logger import logger
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
+DEFAULT_PHRASES_PATH = os.path.join(DATA_DIR, "prompts.json")
+DEFAULT_PROMPTS_DIR = os.path.join(DATA_DIR, "prompts")
+
+# File extension of each audio format, PCM16 is raw 24 kHz mono, G.711 is 8 kHz
+EXTENSIONS = {"pcm16": ".pcm", "g711_ulaw": ".ulaw", "g711_alaw": ".alaw"}
+
+
+def load_phrases(path: str = DEFAULT_PHRASES_PATH) -> Dict[str, str]:
+    """The fixed phrases by phrase ID."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class PromptStore:
+    """
+    Pre-rendered audio of fixed phrases like the greeting or error notices, so they play without any API roundtrip.
+    The files are generated once with prerender.py and stored as <directory>/<voice>/<phrase id>.<format extension>.
+
+    PCM16 files are memory-mapped and played straight from the mapping. G.711 files take a sixth of the space
+    and are decoded once when loaded. preload maps all files of a voice up front, so the first play does not
+    wait for the disk.
+
+    Attributes:
+    directory (str): The root folder of the audio files.
+    voice (str): The voice used when none is given.
+    """
+    def __init__(self, directory: str = DEFAULT_PROMPTS_DIR, voice: str = "alloy"):
+        self.directory = directory
+        self.voice = voice
+        # (voice, phrase id) -> PCM16 audio, a view of a mapping or decoded bytes
+        self._loaded: Dict[tuple, memoryview] = {}
+        self._mappings = []
+
+    def path(self, phrase_id: str, voice: Optional[str] = None, audio_format: str = "pcm16") -> str:
+        return os.path.join(self.directory, voice or self.voice, phrase_id + EXTENSIONS[audio_format])
+
+    def get(self, phrase_id: str, voice: Optional[str] = None) -> Optional[memoryview]:
+        """The phrase as PCM16 at 24 kHz, None when it was not rendered for the voice."""
+        key = (voice or self.voice, phrase_id)
+        if key not in self._loaded:
+            audio = self._load(*key)
+            if audio is None:
+                return None
+            self._loaded[key] = audio
+        return self._loaded[key]
+
+    def preload(self, voice: Optional[str] = None) -> int:
+        """Load every phrase rendered for the voice, returns how many were found."""
+        voice = voice or self.voice
+        folder = os.path.join(self.directory, voice)
+        if not os.path.isdir(folder):
+            logger.debug(f"No pre-rendered prompts for voice {voice} in {self.directory}")
+            return 0
+        phrase_ids = {os.path.splitext(name)[0] for name in os.listdir(folder) if os.path.splitext(name)[1] in EXTENSIONS.values()}
+        return sum(self.get(phrase_id, voice) is not None for phrase_id in phrase_ids)
+
+    def _load(self, voice: str, phrase_id: str) -> Optional[memoryview]:
+        for audio_format in EXTENSIONS:
+            path = self.path(phrase_id, voice, audio_format)
+            try:
+                with open(path, "rb") as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        continue
+                    if audio_format == "pcm16":
+                        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                        if hasattr(mmap, "MADV_WILLNEED"):
+                            # Read ahead now rather than on the first play
+                            mapping.madvise(mmap.MADV_WILLNEED)
+                        self._mappings.append(mapping)
+                        return memoryview(mapping)
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.error(f"Error loading prompt {path}: {e}")
+                continue
+
+            # NumPy is only needed for G.711 prompts
+            from .g711 import g711_decode
+
+            return memoryview(g711_decode(data, "ulaw" if audio_format == "g711_ulaw" else "alaw"))
+        return None
+
+    def save(self, phrase_id: str, voice: str, audio_format: str, audio: bytes) -> str:
+        """Store a rendered phrase, replacing the files of the phrase in other formats."""
+        path = self.path(phrase_id, voice, audio_format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+        for other_format in EXTENSIONS:
+            other_path = self.path(phrase_id, voice, other_format)
+            if other_format != audio_format and os.path.exists(other_path):
+                os.remove(other_path)
+        return path
+
+    def close(self) -> None:
+        for audio in self._loaded.values():
+            audio.release()
+        self._loaded.clear()
+        for mapping in self._mappings:
+            mapping.close()
+        self._mappings.clear()
@@ -1,16 +1,28 @@
+import asyncio
 import websockets
 import json
 import base64
 import io
 
-from typing import Optional, Callable, List, Dict, Any
+from collections import deque
+
+from typing import Optional, Callable, List, Dict, Any, TYPE_CHECKING
 from enum import Enum
-from pydub import AudioSegment
+from .tools import ToolRuntime
+from .scheduler import AdmissionScheduler, Priority
+from .recording import iter_chunks, UPLOAD_CHUNK
+from .audio_formats import AUDIO_FORMATS, wav_header
+from .network import QualityController, QualityLevel
 from .logger import logger
 
+# pydub and NumPy are slow to import and only needed by some modes, they are imported on first use
+if TYPE_CHECKING:
+    from .endpoint import EndpointDetector, EndpointEvent
+
 class TurnDetectionMode(Enum):
     SERVER_VAD = "server_vad"
     MANUAL = "manual"
+    LOCAL_VAD = "local_vad"
 
 class RealtimeClient:
     """
@@ -28,7 +40,17 @@ class RealtimeClient:
     on_text_delta (Callable[[str], None]): Callback for text delta events. Takes in a string and returns nothing.
     on_audio_delta (Callable[[bytes], None]): Callback for audio delta events. Takes in bytes and returns nothing.
     on_interrupt (Callable[[], None]): Callback for user interrupt events, should be used to stop audio playback.
-    extra_event_handlers (Dict[str, Callable[[Dict[str, Any]], None]]): Additional event handlers. Is a mapping of event names to functions that process the event payload.
+    extra_event_handlers (Dict[str, Callable[[Dict[str, Any]], None]]): Additional event handlers. Is a mapping of event names to functions that process the event payload. They run after the built-in handling of the event.
+    endpoint_detector (EndpointDetector): Detector used to predict the end of the user's turn in local VAD mode.
+    tool_runtime (ToolRuntime): Runtime executing the function calls requested by the model.
+    scheduler (AdmissionScheduler): Admission control for responses, shared by all sessions using the same API key.
+    session_name (str): The name of this session in the scheduler statistics.
+    output_audio_format (str): The format of the assistant audio, "pcm16", "g711_ulaw" or "g711_alaw".
+    quality_controller (QualityController): Adapts the upstream audio and the modalities to the measured link quality.
+    input_audio_format (str): The format the microphone audio is sent in, stream_audio always takes PCM16.
+    modalities (List[str]): The modalities of the responses.
+    packet_ms (int): The least audio sent in one message in milliseconds, 0 to send every chunk right away.
+    prefix_padding_ms (int): Audio from before the detected start of speech that is sent with a turn in local VAD mode.
     """
     def __init__(
         self, 
@@ -90,7 +112,13 @@ Při nejasnostech:
         on_text_delta: Optional[Callable[[str], None]] = None,
         on_audio_delta: Optional[Callable[[bytes], None]] = None,
         on_interrupt: Optional[Callable[[], None]] = None,
-        extra_event_handlers: Optional[Dict[str, Callable[[Dict[str, Any]], None]]] = None
+        extra_event_handlers: Optional[Dict[str, Callable[[Dict[str, Any]], None]]] = None,
+        endpoint_detector: Optional["EndpointDetector"] = None,
+        tool_runtime: Optional[ToolRuntime] = None,
+        scheduler: Optional[AdmissionScheduler] = None,
+        session_name: Optional[str] = None,
+        output_audio_format: str = "pcm16",
+        quality_controller: Optional[QualityController] = None
     ):
         self.api_key = api_key
         self.model = model
@@ -103,11 +131,47 @@ Při nejasnostech:
         self.base_url = "wss://api.openai.com/v1/realtime"
         self.extra_event_handlers = extra_event_handlers or {}
         self.turn_detection_mode = turn_detection_mode
+        self.endpoint_detector = endpoint_detector
+        if self.turn_detection_mode == TurnDetectionMode.LOCAL_VAD and self.endpoint_detector is None:
+            from .endpoint import EndpointDetector
+            self.endpoint_detector = EndpointDetector()
+        self.tool_runtime = tool_runtime
+        self.scheduler = scheduler
+        self.session_name = session_name or f"session-{id(self):x}"
+        self.output_audio_format = output_audio_format
+        self.quality_controller = quality_controller
+        self.input_audio_format = "pcm16"
+        self.modalities = ["text", "audio"]
+        self.packet_ms = quality_controller.level.packet_ms if quality_controller else 0
+        self.prefix_padding_ms = 500
 
         # Track current response state
         self._current_response_id = None
         self._current_item_id = None
         self._is_responding = False
+        # Response requested by local VAD before the user's turn was confirmed over
+        self._speculative_response = False
+        # response.create that may still be waiting for admission
+        self._response_task: Optional[asyncio.Task] = None
+        # Tool calls of the current response, answered together once it is done
+        self._pending_tool_calls: List[tuple] = []
+        # Function names by call ID, the arguments events do not carry them
+        self._tool_names: Dict[str, str] = {}
+        # Tasks nobody awaits, referenced here so they are not garbage collected while running
+        self._background_tasks: set = set()
+
+        # Link quality state
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._upstream = bytearray()
+        self._encoder = None
+        self._user_speaking = False
+        # A format change waits for the end of the user's turn, so one turn is never sent in two formats
+        self._pending_quality: Optional[QualityLevel] = None
+        # Local VAD only sends speech, the latest audio outside of a turn waits here as its beginning
+        self._preroll = deque()
+        self._preroll_bytes = 0
+        # Held while the upstream format changes, so no audio overtakes the session.update announcing it
+        self._upstream_lock = asyncio.Lock()
         
     async def connect(self) -> None:
         """Establish WebSocket connection with the Realtime API."""
@@ -122,24 +186,25 @@ Při nejasnostech:
         # Set up default session configuration
         if self.turn_detection_mode == TurnDetectionMode.MANUAL:
             await self.update_session({
-                "modalities": ["text", "audio"],
+                "modalities": self.modalities,
                 "instructions": self.instructions,
                 "voice": self.voice,
-                "input_audio_format": "pcm16",
-                "output_audio_format": "pcm16",
+                "input_audio_format": self.input_audio_format,
+                "output_audio_format": self.output_audio_format,
                 "input_audio_transcription": {
                     "model": "whisper-1"
                 },
+                "tools": self.tool_runtime.definitions() if self.tool_runtime else [],
                 "tool_choice": "auto",
                 "temperature": 0.8,
             })
         elif self.turn_detection_mode == TurnDetectionMode.SERVER_VAD:
             await self.update_session({
-                "modalities": ["text", "audio"],
+                "modalities": self.modalities,
                 "instructions": self.instructions,
                 "voice": self.voice,
-                "input_audio_format": "pcm16",
-                "output_audio_format": "pcm16",
+                "input_audio_format": self.input_audio_format,
+                "output_audio_format": self.output_audio_format,
                 "input_audio_transcription": {
                     "model": "whisper-1"
                 },
@@ -149,12 +214,82 @@ Při nejasnostech:
                     "prefix_padding_ms": 500,
                     "silence_duration_ms": 200
                 },
+                "tools": self.tool_runtime.definitions() if self.tool_runtime else [],
+                "tool_choice": "auto",
+                "temperature": 0.8,
+            })
+        elif self.turn_detection_mode == TurnDetectionMode.LOCAL_VAD:
+            await self.update_session({
+                "modalities": self.modalities,
+                "instructions": self.instructions,
+                "voice": self.voice,
+                "input_audio_format": self.input_audio_format,
+                "output_audio_format": self.output_audio_format,
+                "input_audio_transcription": {
+                    "model": "whisper-1"
+                },
+                "turn_detection": None,
+                "tools": self.tool_runtime.definitions() if self.tool_runtime else [],
                 "tool_choice": "auto",
                 "temperature": 0.8,
             })
         else:
             raise ValueError(f"Invalid turn detection mode: {self.turn_detection_mode}")
 
+        if self.quality_controller:
+            self._monitor_task = asyncio.create_task(self._monitor_link())
+
+    async def _monitor_link(self) -> None:
+        """Probe the link periodically and follow the decisions of the quality controller."""
+        monitor = self.quality_controller.monitor
+        try:
+            while True:
+                await asyncio.sleep(monitor.interval)
+                await monitor.probe(self.ws)
+                level = self.quality_controller.evaluate()
+                if level:
+                    self._pending_quality = level
+                    # The packet size can change at any time, it is converted to bytes in the format being sent
+                    self.packet_ms = level.packet_ms
+                    if not self._user_speaking:
+                        await self._apply_quality()
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def _new_encoder(self):
+        """An encoder from PCM16 to the current input_audio_format, None when no encoding is needed."""
+        if self.input_audio_format == "pcm16":
+            return None
+        # NumPy is only imported once a link gets bad
+        from .g711 import G711Encoder
+
+        return G711Encoder("ulaw" if self.input_audio_format == "g711_ulaw" else "alaw")
+
+    @property
+    def packet_bytes(self) -> int:
+        """packet_ms of audio in the current input_audio_format."""
+        info = AUDIO_FORMATS[self.input_audio_format]
+        return info["rate"] * info["sample_width"] * self.packet_ms // 1000
+
+    async def _apply_quality(self) -> None:
+        """Switch the upstream format and the modalities chosen by the quality controller."""
+        level, self._pending_quality = self._pending_quality, None
+        if level is None:
+            return
+        if level.input_audio_format == self.input_audio_format and level.modalities == self.modalities:
+            return
+
+        async with self._upstream_lock:
+            # Whatever is still waiting was encoded in the old format, the switch happens before the first await,
+            # so stream_audio encodes every later chunk in the new one
+            old_format, self._upstream = self._upstream, bytearray()
+            self.input_audio_format = level.input_audio_format
+            self.modalities = level.modalities
+            self._encoder = self._new_encoder()
+
+            await self._send_packet(old_format)
+            await self.update_session({"input_audio_format": self.input_audio_format, "modalities": self.modalities})
+
     async def update_session(self, config: Dict[str, Any]) -> None:
         """Update session configuration."""
         event = {
@@ -180,18 +315,28 @@ Při nejasnostech:
         await self.create_response()
 
     async def send_audio(self, audio_bytes: bytes) -> None:
-        """Send audio data to the API."""
-        # Convert audio to required format (24kHz, mono, PCM16)
-        audio = AudioSegment.from_file(io.BytesIO(audio_bytes))
-        audio = audio.set_frame_rate(24000).set_channels(1).set_sample_width(2)
-        pcm_data = base64.b64encode(audio.raw_data).decode()
-        
-        # Append audio to buffer
-        append_event = {
-            "type": "input_audio_buffer.append",
-            "audio": pcm_data
-        }
-        await self.ws.send(json.dumps(append_event))
+        """Send audio data to the API. Takes an audio file as bytes or any bytes-like object."""
+        audio = memoryview(audio_bytes)
+        header_size = len(wav_header("pcm16", 0))
+        if len(audio) >= header_size and audio[:header_size] == wav_header("pcm16", len(audio) - header_size):
+            # Already in the required format, e.g. a recording of AudioHandler, sent straight from its buffer
+            chunks = iter_chunks(audio, UPLOAD_CHUNK, start=header_size)
+        else:
+            from pydub import AudioSegment
+
+            # Convert audio to required format (24kHz, mono, PCM16)
+            segment = AudioSegment.from_file(io.BytesIO(audio))
+            segment = segment.set_frame_rate(24000).set_channels(1).set_sample_width(2)
+            chunks = iter_chunks(memoryview(segment.raw_data), UPLOAD_CHUNK)
+
+        encoder = self._new_encoder()
+        # Append audio to buffer, in parts so a long recording is never encoded at once
+        for chunk in chunks:
+            append_event = {
+                "type": "input_audio_buffer.append",
+                "audio": base64.b64encode(encoder.encode(chunk) if encoder else chunk).decode()
+            }
+            await self.ws.send(json.dumps(append_event))
         
         # Commit the buffer
         commit_event = {
@@ -204,30 +349,131 @@ Při nejasnostech:
             await self.create_response()
 
     async def stream_audio(self, audio_chunk: bytes) -> None:
-        """Stream raw audio data to the API."""
-        audio_b64 = base64.b64encode(audio_chunk).decode()
-        
+        """Stream raw audio data (PCM16 at 24 kHz) to the API."""
+        if self.turn_detection_mode != TurnDetectionMode.LOCAL_VAD:
+            await self._append_upstream(audio_chunk)
+            return
+
+        # Unlike server VAD, the server keeps everything appended, so only the turns themselves are sent
+        in_speech = self.endpoint_detector.in_speech
+        endpoint_events = self.endpoint_detector.process(audio_chunk)
+        if in_speech:
+            await self._append_upstream(audio_chunk)
+        else:
+            self._preroll.append(audio_chunk)
+            self._preroll_bytes += len(audio_chunk)
+            max_bytes = 24000 * 2 * self.prefix_padding_ms // 1000
+            while self._preroll_bytes - len(self._preroll[0]) >= max_bytes:
+                self._preroll_bytes -= len(self._preroll.popleft())
+
+        for endpoint_event in endpoint_events:
+            await self.handle_endpoint_event(endpoint_event)
+
+    async def _append_upstream(self, audio_chunk: bytes) -> None:
+        self._upstream += self._encoder.encode(audio_chunk) if self._encoder else audio_chunk
+        if len(self._upstream) >= self.packet_bytes:
+            await self._send_upstream()
+
+    async def _start_turn_audio(self) -> None:
+        """Drop whatever the server buffered outside of a turn and send the pre-roll as the start of the new one."""
+        async with self._upstream_lock:
+            await self.ws.send(json.dumps({"type": "input_audio_buffer.clear"}))
+        preroll, self._preroll, self._preroll_bytes = self._preroll, deque(), 0
+        for audio_chunk in preroll:
+            await self._append_upstream(audio_chunk)
+
+    async def _send_upstream(self) -> None:
+        """Send the audio collected for the next packet."""
+        async with self._upstream_lock:
+            packet, self._upstream = self._upstream, bytearray()
+            await self._send_packet(packet)
+
+    async def _send_packet(self, packet: bytearray) -> None:
+        if not packet:
+            return
         append_event = {
             "type": "input_audio_buffer.append",
-            "audio": audio_b64
+            "audio": base64.b64encode(packet).decode()
         }
-        await self.ws.send(json.dumps(append_event))
+        message = json.dumps(append_event)
+        await self.ws.send(message)
+        if self.quality_controller:
+            self.quality_controller.monitor.record_sent(len(message))
 
-    async def create_response(self, functions: Optional[List[Dict[str, Any]]] = None) -> None:
-        """Request a response from the API. Needed when using manual mode."""
+    async def commit_audio(self) -> None:
+        """Commit the streamed audio buffer as a user message."""
+        await self._send_upstream()
+        event = {
+            "type": "input_audio_buffer.commit"
+        }
+        await self.ws.send(json.dumps(event))
+
+    async def handle_endpoint_event(self, endpoint_event: "EndpointEvent") -> None:
+        """
+        React to the local endpoint detector. The response is requested as soon as the turn looks finished
+        and cancelled again if the user keeps talking.
+        """
+        from .endpoint import EndpointEvent
+
+        if endpoint_event == EndpointEvent.SPEECH_STARTED:
+            logger.info("[Speech detected]")
+            self._user_speaking = True
+            await self._start_turn_audio()
+            if self._is_responding:
+                await self.handle_interruption()
+            elif self._speculative_response:
+                logger.info("[Speech resumed, cancelling speculative response]")
+                if self._response_task and not self._response_task.done():
+                    # Still queued for admission, it never reached the API
+                    self._response_task.cancel()
+                else:
+                    await self.cancel_response()
+            self._speculative_response = False
+
+            if self.on_interrupt:
+                self.on_interrupt()
+
+        elif endpoint_event == EndpointEvent.END_OF_TURN:
+            logger.info("[Speech ended]")
+            self._user_speaking = False
+            await self.commit_audio()
+            await self._apply_quality()
+            # Waiting for admission must not hold up the audio stream
+            self._response_task = asyncio.create_task(self.create_response())
+            self._speculative_response = True
+
+    async def create_response(
+        self,
+        functions: Optional[List[Dict[str, Any]]] = None,
+        priority: Priority = Priority.NORMAL,
+        instructions: Optional[str] = None,
+        out_of_band: bool = False
+    ) -> None:
+        """
+        Request a response from the API. Needed when using manual mode. Waits for the scheduler if there is one.
+        Instructions replace the session instructions for this response, an out of band response is not added
+        to the conversation.
+        """
         event = {
             "type": "response.create",
             "response": {
-                "modalities": ["text", "audio"]
+                "modalities": self.modalities
             }
         }
         if functions:
             event["response"]["tools"] = functions
+        if instructions:
+            event["response"]["instructions"] = instructions
+        if out_of_band:
+            event["response"]["conversation"] = "none"
+
+        if self.scheduler:
+            await self.scheduler.acquire(self.session_name, priority)
             
         await self.ws.send(json.dumps(event))
 
-    async def send_function_result(self, call_id: str, result: Any) -> None:
-        """Send function call result back to the API."""
+    async def send_function_result(self, call_id: str, result: Any, respond: bool = True) -> None:
+        """Send function call result back to the API. Set respond to False when sending several results at once."""
         event = {
             "type": "conversation.item.create",
             "item": {
@@ -239,7 +485,17 @@ Při nejasnostech:
         await self.ws.send(json.dumps(event))
 
         # functions need a manual response
-        await self.create_response()
+        if respond:
+            await self.create_response()
+
+    async def send_tool_results(self, tool_calls: List[tuple]) -> None:
+        """Wait for the running tool calls, send all their results and request a single follow-up response."""
+        call_ids = [call_id for call_id, _ in tool_calls]
+        outputs = await asyncio.gather(*(task for _, task in tool_calls))
+        for call_id, output in zip(call_ids, outputs):
+            await self.send_function_result(call_id, output, respond=False)
+        # The user is already waiting on this answer
+        await self.create_response(priority=Priority.HIGH)
 
     async def cancel_response(self) -> None:
         """Cancel the current response."""
@@ -284,7 +540,12 @@ Při nejasnostech:
                 
                 if event_type == "error":
                     logger.error(f"Error: {event['error']}")
-                    continue
+                    if self.scheduler and event["error"].get("code") == "rate_limit_exceeded":
+                        self.scheduler.throttle()
+
+                elif event_type == "rate_limits.updated":
+                    if self.scheduler:
+                        self.scheduler.update(event["rate_limits"])
                 
                 # Track response state
                 elif event_type == "response.created":
@@ -292,16 +553,47 @@ Při nejasnostech:
                     self._is_responding = True
                 
                 elif event_type == "response.output_item.added":
-                    self._current_item_id = event.get("item", {}).get("id")
+                    item = event.get("item", {})
+                    self._current_item_id = item.get("id")
+                    if item.get("type") == "function_call":
+                        self._tool_names[item.get("call_id")] = item.get("name")
                 
                 elif event_type == "response.done":
                     self._is_responding = False
+                    self._speculative_response = False
                     self._current_response_id = None
                     self._current_item_id = None
+
+                    usage = event.get("response", {}).get("usage")
+                    if self.scheduler and usage and usage.get("total_tokens"):
+                        self.scheduler.record_usage(usage["total_tokens"])
+
+                    if self._pending_tool_calls:
+                        tool_calls, self._pending_tool_calls = self._pending_tool_calls, []
+                        if event.get("response", {}).get("status") == "cancelled":
+                            # The user interrupted, nobody is waiting for these results anymore
+                            for _, task in tool_calls:
+                                task.cancel()
+                        else:
+                            task = asyncio.create_task(self.send_tool_results(tool_calls))
+                            self._background_tasks.add(task)
+                            task.add_done_callback(self._background_tasks.discard)
+
+                # Start tool calls as soon as their arguments are complete
+                elif event_type == "response.function_call_arguments.done":
+                    call_id = event.get("call_id")
+                    name = self._tool_names.pop(call_id, None) or event.get("name")
+                    if self.tool_runtime and not name:
+                        logger.error(f"Tool call {call_id} without a function name, skipping it")
+                    elif self.tool_runtime:
+                        logger.info(f"[Tool call: {name}]")
+                        task = asyncio.create_task(self.tool_runtime.execute(name, event["arguments"]))
+                        self._pending_tool_calls.append((call_id, task))
                 
                 # Handle interruptions
                 elif event_type == "input_audio_buffer.speech_started":
                     logger.info("[Speech detected]")
+                    self._user_speaking = True
                     if self._is_responding:
                         await self.handle_interruption()
 
@@ -311,6 +603,8 @@ Při nejasnostech:
                 
                 elif event_type == "input_audio_buffer.speech_stopped":
                     logger.info("[Speech ended]")
+                    self._user_speaking = False
+                    await self._apply_quality()
                 
                 # Handle normal response events
                 elif event_type == "response.text.delta":
@@ -322,7 +616,7 @@ Při nejasnostech:
                         audio_bytes = base64.b64decode(event["delta"])
                         self.on_audio_delta(audio_bytes)
                         
-                elif event_type in self.extra_event_handlers:
+                if event_type in self.extra_event_handlers:
                     self.extra_event_handlers[event_type](event)
 
         except websockets.exceptions.ConnectionClosed:
@@ -332,5 +626,7 @@ Při nejasnostech:
 
     async def close(self) -> None:
         """Close the WebSocket connection."""
+        if self._monitor_task:
+            self._monitor_task.cancel()
         if self.ws:
             await self.ws.close()
\ No newline at end of file
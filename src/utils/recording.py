@@ -0,0 +1,97 @@
+import mmap
+import tempfile
+
+from typing import Optional, Iterator
+
+from .logger import logger
+
+# The most audio sent in one input_audio_buffer.append message, 10 seconds of PCM16 at 24 kHz
+UPLOAD_CHUNK = 24000 * 2 * 10
+
+
+def iter_chunks(view: memoryview, size: int, start: int = 0) -> Iterator[memoryview]:
+    """
+    Iterate over a view from start in views of at most size bytes, e.g. to upload a recording in parts.
+    When the view is a whole spilled recording, its pages are released as soon as the next view is requested,
+    so reading a long recording does not pull all of it into memory.
+    """
+    mapping = view.obj if isinstance(view.obj, mmap.mmap) and view.nbytes == len(view.obj) else None
+    released = 0
+    for offset in range(start, len(view), size):
+        yield view[offset:offset + size]
+        if mapping is not None and hasattr(mmap, "MADV_DONTNEED"):
+            end = (offset + size) // mmap.PAGESIZE * mmap.PAGESIZE
+            if end > released:
+                mapping.madvise(mmap.MADV_DONTNEED, released, end - released)
+                released = end
+
+
+class RecordingBuffer:
+    """
+    Collects a recording of any length with bounded memory use.
+    Audio is kept in memory up to max_memory bytes, beyond that everything moves to an unlinked temporary file.
+    When the recording is finished it is exposed as one memoryview, of the bytearray or of a read-only mmap of
+    the file, so it can be uploaded without joining or copying it, see iter_chunks.
+
+    Space for a header (e.g. a WAV header whose sizes are only known at the end) can be reserved at the start.
+
+    Attributes:
+    max_memory (int): How many bytes are kept in memory before spilling to disk.
+    header_size (int): The bytes reserved for the header.
+    directory (str): Where the temporary file is created, None for the system default.
+    size (int): The recorded bytes, without the header.
+    spilled (bool): Whether the recording was moved to disk.
+    """
+    def __init__(self, max_memory: int = 8 * 1024 * 1024, header_size: int = 0, directory: Optional[str] = None):
+        self.max_memory = max_memory
+        self.header_size = header_size
+        self.directory = directory
+        self.size = 0
+        self.spilled = False
+
+        self._memory: Optional[bytearray] = bytearray(header_size)
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+
+    def write(self, data) -> None:
+        """Append audio, called from the recording thread."""
+        if self._view is not None:
+            raise ValueError("The recording is already finished")
+        if self._memory is not None and len(self._memory) + len(data) > self.max_memory:
+            self._spill()
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._memory += data
+        self.size += len(data)
+
+    def _spill(self) -> None:
+        self._file = tempfile.TemporaryFile(dir=self.directory)
+        self._file.write(self._memory)
+        self._memory = None
+        self.spilled = True
+        logger.debug(f"Recording longer than {self.max_memory} bytes, moved to disk")
+
+    def finish(self, header: bytes = b"") -> memoryview:
+        """Fill in the reserved header and return the whole recording, header included, as a read-only view."""
+        if self._view is not None:
+            return self._view
+        if len(header) != self.header_size:
+            raise ValueError(f"The header must be {self.header_size} bytes long")
+
+        if self._file is None:
+            self._memory[:self.header_size] = header
+            self._view = memoryview(self._memory).toreadonly()
+        elif self.header_size + self.size == 0:
+            self._view = memoryview(b"")
+        else:
+            self._file.seek(0)
+            self._file.write(header)
+            self._file.flush()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            # The mapping keeps the data, the file was never linked into a directory
+            self._file.close()
+            self._file = None
+            self._view = memoryview(self._mmap)
+        return self._view
@@ -0,0 +1,238 @@
+import asyncio
+import multiprocessing
+import threading
+
+from multiprocessing import shared_memory
+from typing import Optional
+
+
+class _RingBase:
+    """
+    The position arithmetic and the thread wait shared by RingBuffer and SharedRingBuffer.
+    Subclasses provide the storage (capacity, _view), the positions (_write_pos, _read_pos), the waiting flag
+    (_thread_waiting), the event a waiting thread blocks on (_data_event) and the wakeup (_wake).
+    """
+    @property
+    def available(self) -> int:
+        """Number of bytes ready to be read."""
+        return self._write_pos - self._read_pos
+
+    @property
+    def free(self) -> int:
+        """Number of bytes that can be written without dropping data."""
+        return self.capacity - self.available
+
+    def write(self, data) -> int:
+        """Copy data into the buffer, called by the producer only. Returns how many bytes were written."""
+        size = len(data)
+        n = min(size, self.capacity - self._write_pos + self._read_pos)
+        if n < size:
+            self.dropped += size - n
+
+        start = self._write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        if first == size:
+            # Common case, everything fits without wrapping and without slicing the source
+            self._view[start:start + first] = data
+        else:
+            data = memoryview(data)
+            self._view[start:start + first] = data[:first]
+            if n > first:
+                self._view[:n - first] = data[first:n]
+        self._write_pos += n
+
+        self._wake()
+        return n
+
+    def read_into(self, out) -> int:
+        """Move up to len(out) bytes into out, called by the consumer only. Returns how many bytes were read."""
+        n = min(len(out), self._write_pos - self._read_pos)
+
+        start = self._read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        if first == len(out):
+            out[:] = self._view[start:start + first]
+        else:
+            out = memoryview(out)
+            out[:first] = self._view[start:start + first]
+            if n > first:
+                out[first:n] = self._view[:n - first]
+        self._read_pos += n
+        return n
+
+    def read(self, size: Optional[int] = None) -> bytes:
+        """Read up to size bytes (everything if None) as a new bytes object, called by the consumer only."""
+        available = self.available
+        n = available if size is None else min(size, available)
+
+        # Copied once, straight from the storage into the new bytes object
+        start = self._read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        if first == n:
+            data = bytes(self._view[start:start + n])
+        else:
+            data = b"".join((self._view[start:], self._view[:n - first]))
+        self._read_pos += n
+        return data
+
+    @property
+    def write_position(self) -> int:
+        """Total bytes written so far, a mark the consumer can later discard up to."""
+        return self._write_pos
+
+    def clear(self) -> None:
+        """Drop all buffered data, called by the consumer only."""
+        self._read_pos = self._write_pos
+
+    def discard_until(self, position: int) -> None:
+        """Drop the data written before position (see write_position), called by the consumer only."""
+        if position > self._read_pos:
+            self._read_pos = position
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block the consumer thread until data is available. Returns whether there is data."""
+        if self.available:
+            return True
+        self._thread_waiting = True
+        self._data_event.clear()
+        # Re-check after publishing the flag, the producer may have written in between
+        if not self.available:
+            self._data_event.wait(timeout)
+        self._thread_waiting = False
+        return self.available > 0
+
+    def notify(self) -> None:
+        """Wake up a waiting consumer without writing, e.g. when the stream is being stopped."""
+        self._wake()
+
+    def _wake(self) -> None:
+        raise NotImplementedError
+
+
+class RingBuffer(_RingBase):
+    """
+    Single-producer/single-consumer byte ring buffer used on the audio hot path.
+    The storage is one preallocated bytearray, so passing audio between the PyAudio threads and the event loop
+    does not allocate a new object per chunk and does not take a lock. Only the producer moves the write position
+    and only the consumer moves the read position, so plain integer assignment is enough under the GIL.
+
+    The consumer can wait for data either from a thread (wait) or from the event loop (wait_async).
+
+    Attributes:
+    capacity (int): The size of the buffer in bytes.
+    buffer (bytearray): The backing storage.
+    dropped (int): How many bytes were dropped because the buffer was full.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self._view = memoryview(self.buffer)
+        self.dropped = 0
+
+        # Monotonic positions, the difference is the amount of buffered data
+        self._write_pos = 0
+        self._read_pos = 0
+
+        self._data_event = threading.Event()
+        self._thread_waiting = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiter: Optional[asyncio.Future] = None
+
+    async def wait_async(self) -> None:
+        """Wait on the event loop until data is available or notify is called."""
+        if self.available:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._waiter = self._loop.create_future()
+        # Re-check after publishing the waiter, the producer may have written in between
+        if self.available:
+            self._waiter = None
+            return
+        try:
+            await self._waiter
+        finally:
+            self._waiter = None
+
+    def _wake(self) -> None:
+        # Only pay for a wakeup when a consumer is actually waiting
+        if self._thread_waiting:
+            self._data_event.set()
+        waiter = self._waiter
+        if waiter is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._resolve, waiter)
+
+    @staticmethod
+    def _resolve(waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            waiter.set_result(None)
+
+
+class SharedRingBuffer(_RingBase):
+    """
+    Ring buffer living in multiprocessing shared memory, used to connect two processes.
+    The read and write positions and the waiting flag are kept in a small header in front of the data,
+    the wakeup goes through a multiprocessing.Event. The creating process owns the memory; the other process
+    attaches to it by name. Awaiting from the event loop is not supported, only thread waits.
+
+    Attributes:
+    capacity (int): The size of the buffer in bytes.
+    name (str): The name of the shared memory block, pass it to attach from another process.
+    data_event (multiprocessing.Event): The event used to wake up the consumer.
+    """
+    HEADER_SIZE = 24
+
+    def __init__(self, capacity: int, name: Optional[str] = None, data_event=None):
+        self.capacity = capacity
+        self.dropped = 0
+        self._owner = name is None
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.HEADER_SIZE + capacity)
+        else:
+            # Spawned processes share the resource tracker of the owner, so attaching does not register twice
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+        self._header = self.shm.buf[:self.HEADER_SIZE].cast("Q")
+        self.buffer = self.shm.buf[self.HEADER_SIZE:self.HEADER_SIZE + capacity]
+        self._view = self.buffer
+        if self._owner:
+            self._header[0] = self._header[1] = self._header[2] = 0
+
+        self.data_event = data_event if data_event is not None else multiprocessing.Event()
+        self._data_event = self.data_event
+
+    @property
+    def _write_pos(self) -> int:
+        return self._header[0]
+
+    @_write_pos.setter
+    def _write_pos(self, value: int) -> None:
+        self._header[0] = value
+
+    @property
+    def _read_pos(self) -> int:
+        return self._header[1]
+
+    @_read_pos.setter
+    def _read_pos(self, value: int) -> None:
+        self._header[1] = value
+
+    @property
+    def _thread_waiting(self) -> bool:
+        return bool(self._header[2])
+
+    @_thread_waiting.setter
+    def _thread_waiting(self, value: bool) -> None:
+        self._header[2] = int(value)
+
+    def _wake(self) -> None:
+        if self._thread_waiting:
+            self._data_event.set()
+
+    def close(self) -> None:
+        """Detach from the shared memory, the owner also frees it."""
+        self._header.release()
+        self.buffer.release()
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
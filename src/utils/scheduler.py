@@ -0,0 +1,163 @@
+import asyncio
+import heapq
+import itertools
+
+from collections import deque, defaultdict
+from enum import IntEnum
+from typing import Optional, List, Dict, Any
+
+from .logger import logger
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class AdmissionScheduler:
+    """
+    Admission control for response.create shared by several RealtimeClient sessions using one API key.
+    Tracks the remaining requests and tokens reported by rate_limits.updated events and lets responses through
+    only while there is budget left. Waiting responses are ordered by priority and, within a priority,
+    by start-time fair queuing, so a busy session cannot starve the others.
+
+    All sessions must run on the same event loop.
+
+    Attributes:
+    limits (Dict[str, Dict[str, float]]): Last known limit, remaining amount, reset window and reset time per limit name.
+    request_reserve (int): Requests kept in reserve, not handed out.
+    token_estimate (float): Expected tokens per response, learned from the usage of finished responses.
+    wait_times (deque): Recent queue wait times in seconds.
+    """
+    def __init__(self, request_reserve: int = 1, token_estimate: float = 1000.0, history: int = 1000):
+        self.limits: Dict[str, Dict[str, float]] = {}
+        self.request_reserve = request_reserve
+        self.token_estimate = token_estimate
+        self.wait_times = deque(maxlen=history)
+        self.session_waits: Dict[str, deque] = defaultdict(lambda: deque(maxlen=history))
+
+        self._queue: List[tuple] = []
+        self._counter = itertools.count()
+        self._virtual_time = 0
+        self._last_tag: Dict[str, int] = defaultdict(int)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._paused_until = 0.0
+
+    def update(self, rate_limits: List[Dict[str, Any]]) -> None:
+        """Apply the payload of a rate_limits.updated event."""
+        now = asyncio.get_running_loop().time()
+        for rate_limit in rate_limits:
+            self.limits[rate_limit["name"]] = {
+                "limit": rate_limit["limit"],
+                "remaining": rate_limit["remaining"],
+                "window": rate_limit["reset_seconds"],
+                "reset_at": now + rate_limit["reset_seconds"]
+            }
+        self._dispatch()
+
+    def record_usage(self, total_tokens: int) -> None:
+        """Learn the token cost of a response from its usage."""
+        self.token_estimate = 0.8 * self.token_estimate + 0.2 * total_tokens
+
+    def throttle(self, seconds: float = 1.0) -> None:
+        """Stop admitting for a while, used when the API reports that a limit was hit anyway."""
+        now = asyncio.get_running_loop().time()
+        self._paused_until = max(self._paused_until, now + seconds)
+        logger.warning(f"Rate limited, pausing responses for {seconds:.1f} s")
+
+    async def acquire(self, session: str, priority: Priority = Priority.NORMAL) -> float:
+        """Wait until a response may be created. Returns the time spent waiting in seconds."""
+        loop = asyncio.get_running_loop()
+        enqueued_at = loop.time()
+        future = loop.create_future()
+
+        # Start-time fair queuing, a session's tag never lags behind the tag currently being served
+        tag = max(self._last_tag[session], self._virtual_time) + 1
+        self._last_tag[session] = tag
+        heapq.heappush(self._queue, (int(priority), tag, next(self._counter), future, session))
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The entry stays in the heap and is skipped by _dispatch
+            self._dispatch()
+            raise
+
+        waited = loop.time() - enqueued_at
+        self.wait_times.append(waited)
+        self.session_waits[session].append(waited)
+        if waited > 0.1:
+            logger.debug(f"Response of {session} waited {waited * 1000:.0f} ms for admission")
+        return waited
+
+    def _exhausted(self, now: float) -> List[Dict[str, float]]:
+        """The limits without budget for another response."""
+        # Roll over every expired window first, a limit checked later must not see stale state
+        for state in self.limits.values():
+            if now >= state["reset_at"]:
+                # Assume the window rolled over until the API tells us otherwise
+                state["remaining"] = state["limit"]
+                state["reset_at"] = now + max(state["window"], 0.1)
+
+        exhausted = []
+        requests = self.limits.get("requests")
+        if requests and requests["remaining"] <= self.request_reserve:
+            exhausted.append(requests)
+        tokens = self.limits.get("tokens")
+        if tokens and tokens["remaining"] < self.token_estimate:
+            exhausted.append(tokens)
+        return exhausted
+
+    def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        while self._queue:
+            _, tag, _, future, _ = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            exhausted = self._exhausted(now)
+            if exhausted or now < self._paused_until:
+                self._schedule_retry(loop, now, exhausted)
+                return
+
+            heapq.heappop(self._queue)
+            self._virtual_time = tag
+            # Spend the budget right away, the next rate_limits.updated event corrects it
+            if "requests" in self.limits:
+                self.limits["requests"]["remaining"] -= 1
+            if "tokens" in self.limits:
+                self.limits["tokens"]["remaining"] -= self.token_estimate
+            future.set_result(None)
+
+    def _schedule_retry(self, loop: asyncio.AbstractEventLoop, now: float, exhausted: List[Dict[str, float]]) -> None:
+        """Dispatch again once the pause ends and every exhausted limit resets."""
+        # Limits with budget left resetting earlier would not change anything, waking up for them only spins
+        candidates = [state["reset_at"] for state in exhausted]
+        if self._paused_until > now:
+            candidates.append(self._paused_until)
+        reset_at = max(candidates, default=now + 1.0)
+        if self._timer:
+            self._timer.cancel()
+        self._timer = loop.call_at(reset_at, self._dispatch)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue length and wait times in milliseconds, overall and per session."""
+        def summary(waits):
+            if not waits:
+                return {"count": 0, "avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+            ordered = sorted(waits)
+            return {
+                "count": len(ordered),
+                "avg_ms": sum(ordered) / len(ordered) * 1000,
+                "p95_ms": ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+                "max_ms": ordered[-1] * 1000
+            }
+
+        return {
+            "queued": sum(1 for entry in self._queue if not entry[3].done()),
+            "wait": summary(self.wait_times),
+            "sessions": {session: summary(waits) for session, waits in self.session_waits.items()}
+        }
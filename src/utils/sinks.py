@@ -0,0 +1,360 @@
+import asyncio
+import os
+import time
+
+from collections import deque
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Optional, List, Dict, Any
+
+from .audio_formats import AUDIO_FORMATS, wav_header
+from .logger import logger
+
+
+@dataclass
+class Listener:
+    name: str
+    seq: int
+    event: asyncio.Event = field(default_factory=asyncio.Event)
+    sent: int = 0
+    dropped: int = 0
+
+
+class AudioBroadcaster:
+    """
+    Fans the assistant audio out to any number of listeners, pass its write method as on_audio_delta.
+    Every decoded delta is stored once and all listeners get references to the same bytes objects, nothing is copied
+    or re-encoded. Each listener sends at its own pace and waits for its consumer (e.g. StreamWriter.drain),
+    so a slow consumer only holds back itself.
+
+    The audio arrives in real time and cannot be paused, so at most max_buffered_seconds are kept. A listener that
+    falls further behind skips the oldest audio, the skipped bytes are counted in its dropped attribute.
+
+    Must be used from the event loop thread.
+
+    Attributes:
+    audio_format (str): The output_audio_format of the session, "pcm16", "g711_ulaw" or "g711_alaw".
+    max_bytes (int): The most audio kept for listeners that are behind.
+    listeners (List[Listener]): The subscribed listeners.
+    """
+    def __init__(self, audio_format: str = "pcm16", max_buffered_seconds: float = 5.0):
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unsupported audio format: {audio_format}")
+        self.audio_format = audio_format
+        info = AUDIO_FORMATS[audio_format]
+        self.max_bytes = int(max_buffered_seconds * info["rate"] * info["sample_width"])
+        self.listeners: List[Listener] = []
+        self.closed = False
+
+        self._chunks: deque = deque()
+        self._first_seq = 0
+        self._next_seq = 0
+        self._buffered = 0
+
+    def write(self, chunk: bytes) -> None:
+        """Add a decoded audio delta and wake up the listeners."""
+        if self.closed or not chunk:
+            return
+        self._chunks.append(chunk)
+        self._next_seq += 1
+        self._buffered += len(chunk)
+        while self._buffered > self.max_bytes and len(self._chunks) > 1:
+            self._pop()
+        self._trim()
+        for listener in self.listeners:
+            listener.event.set()
+
+    def interrupt(self) -> None:
+        """Skip the audio nobody has sent yet, used when the user interrupts the assistant."""
+        for listener in self.listeners:
+            listener.seq = self._next_seq
+        self._trim()
+
+    def subscribe(self, name: str) -> Listener:
+        """Add a listener starting with the next delta."""
+        listener = Listener(name=name, seq=self._next_seq)
+        self.listeners.append(listener)
+        logger.info(f"Audio listener {name} connected")
+        return listener
+
+    def unsubscribe(self, listener: Listener) -> None:
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+            logger.info(f"Audio listener {listener.name} disconnected, sent {listener.sent} bytes, dropped {listener.dropped}")
+            self._trim()
+
+    async def next_chunks(self, listener: Listener) -> List[bytes]:
+        """Wait for audio the listener has not seen yet. Returns an empty list once the broadcaster is closed."""
+        while listener.seq == self._next_seq and not self.closed:
+            listener.event.clear()
+            await listener.event.wait()
+        if listener.seq < self._first_seq:
+            listener.seq = self._first_seq
+
+        chunks = list(islice(self._chunks, listener.seq - self._first_seq, None))
+        listener.seq = self._next_seq
+        listener.sent += sum(len(chunk) for chunk in chunks)
+        self._trim()
+        return chunks
+
+    def _pop(self) -> None:
+        chunk = self._chunks.popleft()
+        self._buffered -= len(chunk)
+        for listener in self.listeners:
+            if listener.seq == self._first_seq:
+                listener.dropped += len(chunk)
+                listener.seq += 1
+                if listener.dropped == len(chunk):
+                    logger.warning(f"Audio listener {listener.name} is too slow, skipping audio")
+        self._first_seq += 1
+
+    def _trim(self) -> None:
+        """Forget the chunks all listeners have already taken."""
+        oldest = min((listener.seq for listener in self.listeners), default=self._next_seq)
+        while self._first_seq < oldest:
+            self._pop()
+
+    def close(self) -> None:
+        """Stop all listeners after they send what they already have."""
+        self.closed = True
+        for listener in self.listeners:
+            listener.event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Buffered bytes and the sent and dropped bytes per listener."""
+        return {
+            "buffered": self._buffered,
+            "listeners": {listener.name: {"sent": listener.sent, "dropped": listener.dropped} for listener in self.listeners}
+        }
+
+
+class _SocketSink:
+    """Serves the broadcast audio to every client connecting to a server socket."""
+    def __init__(self, broadcaster: AudioBroadcaster):
+        self.broadcaster = broadcaster
+        self.server: Optional[asyncio.AbstractServer] = None
+        # Writers of the connected clients by their handler task
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        name = self._client_name(writer)
+        try:
+            prefix = await self._start(reader, writer)
+            if prefix is None:
+                return
+            writer.write(prefix)
+            await self._stream(name, writer)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving audio to {name}: {e}")
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def _stream(self, name: str, writer: asyncio.StreamWriter) -> None:
+        listener = self.broadcaster.subscribe(name)
+        try:
+            while True:
+                chunks = await self.broadcaster.next_chunks(listener)
+                if not chunks:
+                    await self._finish(writer)
+                    return
+                writer.writelines(self._frame(chunks))
+                # Backpressure, wait until the client takes the data
+                await writer.drain()
+        finally:
+            self.broadcaster.unsubscribe(listener)
+
+    def _client_name(self, writer: asyncio.StreamWriter) -> str:
+        return str(writer.get_extra_info("peername") or id(writer))
+
+    async def _start(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[bytes]:
+        """Returns the bytes sent before the audio, None to refuse the client."""
+        return b""
+
+    def _frame(self, chunks: List[bytes]) -> List[bytes]:
+        return chunks
+
+    async def _finish(self, writer: asyncio.StreamWriter) -> None:
+        await writer.drain()
+
+    async def close(self) -> None:
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        # Disconnect the clients still waiting on a full socket, their handlers then finish on their own
+        for writer in self._connections.values():
+            writer.transport.abort()
+        if self._connections:
+            await asyncio.wait(list(self._connections))
+
+
+class HTTPAudioSink(_SocketSink):
+    """
+    Serves the assistant audio over HTTP as an endless WAV stream with chunked transfer encoding,
+    playable by browsers and media players, e.g. `ffplay http://host:port/`.
+
+    Attributes:
+    host (str): The address to listen on.
+    port (int): The port to listen on.
+    """
+    def __init__(self, broadcaster: AudioBroadcaster, host: str = "127.0.0.1", port: int = 8765):
+        super().__init__(broadcaster)
+        self.host = host
+        self.port = port
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Serving assistant audio on http://{self.host}:{self.port}/")
+
+    async def _start(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[bytes]:
+        request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5.0)
+        method = request.split(b" ", 1)[0]
+        if method != b"GET":
+            writer.write(b"HTTP/1.1 405 Method Not Allowed\r\nAllow: GET\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            return None
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: audio/wav\r\n"
+            b"Cache-Control: no-store\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        header = wav_header(self.broadcaster.audio_format)
+        return b"%x\r\n%s\r\n" % (len(header), header)
+
+    def _frame(self, chunks: List[bytes]) -> List[bytes]:
+        # One HTTP chunk per delta, the audio itself is passed on without copying
+        framed = []
+        for chunk in chunks:
+            framed.extend((b"%x\r\n" % len(chunk), chunk, b"\r\n"))
+        return framed
+
+    async def _finish(self, writer: asyncio.StreamWriter) -> None:
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+class UnixSocketAudioSink(_SocketSink):
+    """
+    Serves the raw assistant audio, without any header, to every client of a UNIX socket.
+    Not available on Windows.
+
+    Attributes:
+    path (str): The path of the socket.
+    """
+    def __init__(self, broadcaster: AudioBroadcaster, path: str = "/tmp/car-lector-audio.sock"):
+        super().__init__(broadcaster)
+        self.path = path
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._handle, self.path)
+        logger.info(f"Serving assistant audio on {self.path}")
+
+    def _client_name(self, writer: asyncio.StreamWriter) -> str:
+        return f"{self.path}#{id(writer):x}"
+
+    async def close(self) -> None:
+        await super().close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class WavFileSink:
+    """
+    Writes the assistant audio into rolling WAV files, a new file every segment_seconds, keeping the newest keep files.
+    The files are written in a worker thread and the header is updated after every write, so a file is valid
+    even while it is being written.
+
+    Attributes:
+    broadcaster (AudioBroadcaster): The source of the audio.
+    directory (str): Where the files are written.
+    segment_bytes (int): The size of the audio in one file.
+    keep (int): How many files are kept, 0 to keep all of them.
+    files (deque): The paths of the kept files, oldest first.
+    """
+    def __init__(self, broadcaster: AudioBroadcaster, directory: str, segment_seconds: float = 300.0, keep: int = 12):
+        self.broadcaster = broadcaster
+        self.directory = directory
+        info = AUDIO_FORMATS[broadcaster.audio_format]
+        self.segment_bytes = int(segment_seconds * info["rate"]) * info["sample_width"]
+        self.keep = keep
+        self.files = deque()
+
+        self._file = None
+        self._size = 0
+        self._segments = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Writing assistant audio to {self.directory}")
+
+    async def _run(self) -> None:
+        listener = self.broadcaster.subscribe(f"wav:{self.directory}")
+        try:
+            while True:
+                chunks = await self.broadcaster.next_chunks(listener)
+                if not chunks:
+                    break
+                # The next chunks wait in the broadcaster until the disk catches up
+                await asyncio.to_thread(self._write, chunks)
+        except Exception as e:
+            logger.error(f"Error writing audio file: {e}")
+        finally:
+            self.broadcaster.unsubscribe(listener)
+            await asyncio.to_thread(self._close_file)
+
+    def _write(self, chunks: List[bytes]) -> None:
+        for chunk in chunks:
+            view = memoryview(chunk)
+            while view:
+                if self._file is None:
+                    self._open_file()
+                n = min(len(view), self.segment_bytes - self._size)
+                self._file.write(view[:n])
+                self._size += n
+                view = view[n:]
+                if self._size >= self.segment_bytes:
+                    self._close_file()
+        if self._file:
+            self._update_header()
+
+    def _open_file(self) -> None:
+        self._segments += 1
+        path = os.path.join(self.directory, time.strftime("assistant-%Y%m%d-%H%M%S") + f"-{self._segments:04d}.wav")
+        self._file = open(path, "wb")
+        self._file.write(wav_header(self.broadcaster.audio_format, 0))
+        self._size = 0
+        self.files.append(path)
+        while self.keep and len(self.files) > self.keep:
+            old_path = self.files.popleft()
+            try:
+                os.remove(old_path)
+            except OSError as e:
+                logger.error(f"Error removing old audio file: {e}")
+
+    def _update_header(self) -> None:
+        self._file.seek(0)
+        self._file.write(wav_header(self.broadcaster.audio_format, self._size))
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+
+    def _close_file(self) -> None:
+        if self._file:
+            self._update_header()
+            self._file.close()
+            self._file = None
+
+    async def close(self) -> None:
+        """Write what is left and close the current file, the broadcaster must be closed first."""
+        if self._task:
+            await self._task
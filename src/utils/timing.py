@@ -0,0 +1,41 @@
+import time
+
+from contextlib import contextmanager
+from typing import Optional, Dict, Tuple
+
+from .logger import logger
+
+
+class StartupTimer:
+    """
+    Measures the startup phases of an application. Phases may run concurrently, in threads or on the event loop,
+    so each one is recorded with its offset from the launch as well as its duration.
+
+    Attributes:
+    start (float): The launch time as returned by time.perf_counter.
+    phases (Dict[str, Tuple[float, float]]): Offset and duration in seconds of every finished phase.
+    """
+    def __init__(self, start: Optional[float] = None):
+        self.start = start if start is not None else time.perf_counter()
+        self.phases: Dict[str, Tuple[float, float]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as a phase called name."""
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (phase_start - self.start, time.perf_counter() - phase_start)
+
+    def add_phase(self, name: str, start: float, end: float) -> None:
+        """Record a phase measured elsewhere, start and end are time.perf_counter values."""
+        self.phases[name] = (start - self.start, end - start)
+
+    def report(self, milestone: str = "ready") -> float:
+        """Log the breakdown and return the time from launch to now in seconds."""
+        total = time.perf_counter() - self.start
+        logger.info(f"Startup took {total * 1000:.0f} ms until {milestone}:")
+        for name, (offset, duration) in sorted(self.phases.items(), key=lambda item: item[1][0]):
+            logger.info(f"  {name:<20} starts at {offset * 1000:6.0f} ms, takes {duration * 1000:6.0f} ms")
+        return total
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Callable, List, Dict, Any
+
+from .logger import logger
+
+
+@dataclass
+class Tool:
+    name: str
+    func: Callable[..., Any]
+    description: str
+    parameters: Dict[str, Any]
+    timeout: Optional[float] = None
+    cacheable: bool = True
+
+
+@dataclass
+class ToolStats:
+    calls: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    latencies_ms: List[float] = field(default_factory=list)
+
+
+class ToolRuntime:
+    """
+    Executes function calls requested by the Realtime API.
+    Tool functions are plain synchronous callables, they run in a thread pool so several calls from one response
+    run concurrently and never block the event loop. Results of identical calls are cached.
+
+    Attributes:
+    tools (Dict[str, Tool]): The registered tools by name.
+    default_timeout (float): Timeout in seconds for tools without their own timeout.
+    cache_size (int): The maximum number of cached results.
+    stats (Dict[str, ToolStats]): Call counts and latencies per tool.
+    """
+    def __init__(self, max_workers: int = 4, default_timeout: float = 5.0, cache_size: int = 256):
+        self.tools: Dict[str, Tool] = {}
+        self.default_timeout = default_timeout
+        self.cache_size = cache_size
+        self.stats: Dict[str, ToolStats] = {}
+        self._cache: OrderedDict = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def register(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        description: str,
+        parameters: Dict[str, Any],
+        timeout: Optional[float] = None,
+        cacheable: bool = True
+    ) -> None:
+        """Register a tool. The parameters are a JSON schema of the keyword arguments of func."""
+        self.tools[name] = Tool(name, func, description, parameters, timeout, cacheable)
+        self.stats[name] = ToolStats()
+
+    def definitions(self) -> List[Dict[str, Any]]:
+        """Return the tool definitions in the format expected by session.update."""
+        return [
+            {
+                "type": "function",
+                "name": tool.name,
+                "description": tool.description,
+                "parameters": tool.parameters
+            }
+            for tool in self.tools.values()
+        ]
+
+    async def execute(self, name: str, arguments: str) -> str:
+        """Run a tool with JSON encoded arguments and return its JSON encoded output."""
+        tool = self.tools.get(name)
+        if tool is None:
+            logger.error(f"Unknown tool: {name}")
+            return json.dumps({"error": f"Unknown tool: {name}"})
+
+        stats = self.stats[name]
+        stats.calls += 1
+        cache_key = (name, arguments)
+        if tool.cacheable and cache_key in self._cache:
+            stats.cache_hits += 1
+            self._cache.move_to_end(cache_key)
+            return self._cache[cache_key]
+
+        start = time.perf_counter()
+        try:
+            kwargs = json.loads(arguments) if arguments else {}
+            loop = asyncio.get_running_loop()
+            result = await asyncio.wait_for(
+                loop.run_in_executor(self._executor, lambda: tool.func(**kwargs)),
+                timeout=tool.timeout or self.default_timeout
+            )
+            output = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+        except asyncio.TimeoutError:
+            # The worker thread cannot be killed, it finishes in the background and its result is dropped
+            stats.timeouts += 1
+            logger.error(f"Tool {name} timed out")
+            return json.dumps({"error": f"Tool {name} timed out"})
+        except Exception as e:
+            stats.errors += 1
+            logger.error(f"Error in tool {name}: {e}")
+            return json.dumps({"error": str(e)})
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        stats.latencies_ms.append(elapsed_ms)
+        # Keep only recent samples
+        del stats.latencies_ms[:-100]
+        logger.debug(f"Tool {name} finished in {elapsed_ms:.1f} ms")
+
+        if tool.cacheable:
+            self._cache[cache_key] = output
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return output
+
+    def shutdown(self) -> None:
+        """Stop the worker threads."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
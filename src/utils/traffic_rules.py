@@ -0,0 +1,95 @@
+import json
+import math
+import os
+import re
+import unicodedata
+
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Optional
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data", "traffic_rules.json")
+
+# Common Czech words that carry no meaning for the search
+STOPWORDS = {
+    "a", "i", "k", "ke", "o", "s", "se", "v", "ve", "z", "ze", "na", "do", "od", "po", "pro", "pri", "za",
+    "je", "jsou", "byt", "by", "ma", "mam", "mit", "musi", "musim", "smi", "smim", "nebo", "ale", "jak",
+    "kdy", "kde", "co", "ktery", "ktera", "ktere", "to", "ten", "ta", "tak", "jen", "uz", "jeste", "si"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip diacritics and cut words to a short prefix, a cheap stand-in for Czech stemming."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [word[:6] for word in re.findall(r"[a-z0-9]+", text) if word not in STOPWORDS]
+
+
+class TrafficRulesIndex:
+    """
+    In-memory BM25 index over Czech traffic rules and road signs.
+    Used as a local tool so the assistant can quote the exact rule instead of paraphrasing from memory.
+
+    Attributes:
+    documents (List[Dict[str, Any]]): The indexed rules, each with id, title, citation and text.
+    k1 (float): BM25 term frequency saturation.
+    b (float): BM25 document length normalization.
+    postings (Dict[str, List[tuple]]): The inverted index, mapping a term to (document index, term frequency) pairs.
+    """
+    def __init__(self, path: str = DEFAULT_RULES_PATH, k1: float = 1.5, b: float = 0.75):
+        with open(path, encoding="utf-8") as f:
+            self.documents: List[Dict[str, Any]] = json.load(f)
+        self.k1 = k1
+        self.b = b
+
+        self.postings: Dict[str, List[tuple]] = defaultdict(list)
+        self.doc_lengths: List[int] = []
+        for doc_idx, doc in enumerate(self.documents):
+            # Titles are short and precise, count them twice
+            terms = tokenize(doc["title"]) * 2 + tokenize(doc["text"])
+            self.doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings[term].append((doc_idx, tf))
+
+        n_docs = len(self.documents)
+        self.avg_length = sum(self.doc_lengths) / n_docs if n_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """Return the best matching rules for the query, most relevant first."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_idx, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_idx] / self.avg_length)
+                scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [dict(self.documents[doc_idx], score=round(score, 3)) for doc_idx, score in ranked]
+
+    def register(self, runtime, name: str = "search_traffic_rules", timeout: Optional[float] = None) -> None:
+        """Register the index as a tool on the given ToolRuntime."""
+        runtime.register(
+            name,
+            self.search,
+            description="Vyhledá přesné znění pravidel silničního provozu a význam dopravních značek v ČR včetně citace předpisu.",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Dotaz v češtině, např. 'přednost tramvaje' nebo 'značka zákaz stání'."
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximální počet vrácených pravidel."
+                    }
+                },
+                "required": ["query"]
+            },
+            timeout=timeout
+        )
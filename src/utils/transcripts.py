@@ -0,0 +1,233 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from typing import Optional, Callable, Dict, Any
+
+from .logger import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS utterances (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    role TEXT NOT NULL,
+    item_id TEXT,
+    response_id TEXT,
+    text TEXT NOT NULL,
+    complete INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    name TEXT NOT NULL,
+    payload TEXT,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class TranscriptSink:
+    """
+    Stores what the student said and what the assistant answered for lesson review.
+    The event handlers only assemble deltas into utterances and put finished rows on a bounded queue, a writer thread
+    inserts them into SQLite (WAL mode) in batches, so the event loop never waits on the disk.
+
+    Memory is bounded: at most max_pending rows wait for the writer and at most max_open utterances are assembled
+    at a time. Rows that do not fit are dropped and counted, the oldest open utterance is stored as incomplete.
+
+    Attributes:
+    path (str): The SQLite database file.
+    session (str): The session name stored with every row.
+    batch_size (int): The maximum number of rows written in one transaction.
+    flush_interval (float): How long the writer waits to fill a batch, in seconds.
+    dropped (int): How many rows were dropped because the queue was full.
+    written (int): How many rows were written.
+    """
+    def __init__(
+        self,
+        path: str = "transcripts.db",
+        session: str = "default",
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+        max_open: int = 32,
+        max_chars: int = 20000
+    ):
+        self.path = path
+        self.session = session
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_open = max_open
+        self.max_chars = max_chars
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.write_seconds = 0.0
+
+        # item_id -> response_id, text parts and their total length
+        self._open: Dict[str, Dict[str, Any]] = {}
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stop = object()
+        # Opened here, so a bad path or a locked database fails the caller instead of the writer thread
+        self._connection = self._connect()
+        self._writer = threading.Thread(target=self._write_loop, name="transcript-writer", daemon=True)
+        self._writer.start()
+
+    def handlers(self) -> Dict[str, Callable[[Dict[str, Any]], None]]:
+        """Event handlers to pass to RealtimeClient as extra_event_handlers."""
+        return {
+            "conversation.item.input_audio_transcription.completed": self.on_user_transcript,
+            "response.text.delta": self.on_assistant_delta,
+            "response.audio_transcript.delta": self.on_assistant_delta,
+            "response.text.done": self.on_assistant_done,
+            "response.audio_transcript.done": self.on_assistant_done,
+            "response.done": self.on_response_done,
+        }
+
+    def on_user_transcript(self, event: Dict[str, Any]) -> None:
+        self._enqueue(("utterance", "user", event.get("item_id"), None, event.get("transcript", ""), True, time.time()))
+
+    def on_assistant_delta(self, event: Dict[str, Any]) -> None:
+        item_id = event.get("item_id")
+        utterance = self._open.get(item_id)
+        if utterance is None:
+            if len(self._open) >= self.max_open:
+                # Forget the oldest utterance, store what we have of it
+                self._finish(next(iter(self._open)), complete=False)
+            utterance = self._open[item_id] = {"response_id": event.get("response_id"), "parts": [], "chars": 0}
+
+        delta = event.get("delta", "")
+        if utterance["chars"] + len(delta) <= self.max_chars:
+            utterance["parts"].append(delta)
+            utterance["chars"] += len(delta)
+
+    def on_assistant_done(self, event: Dict[str, Any]) -> None:
+        item_id = event.get("item_id")
+        # The done events carry the full text, prefer it over the assembled deltas
+        text = event.get("transcript", event.get("text"))
+        if item_id in self._open or text:
+            self._finish(item_id, complete=True, text=text)
+
+    def on_response_done(self, event: Dict[str, Any]) -> None:
+        """Store whatever is left of the response, e.g. when it was interrupted."""
+        response_id = event.get("response", {}).get("id")
+        for item_id in [key for key, value in self._open.items() if value["response_id"] == response_id]:
+            self._finish(item_id, complete=False)
+
+    def record_event(self, name: str, payload: Optional[Dict[str, Any]] = None) -> None:
+        """Store an analytics event, e.g. a tool call or a latency measurement."""
+        self._enqueue(("event", name, json.dumps(payload, ensure_ascii=False) if payload else None, time.time()))
+
+    def _finish(self, item_id: str, complete: bool, text: Optional[str] = None) -> None:
+        utterance = self._open.pop(item_id, None)
+        response_id = utterance["response_id"] if utterance else None
+        if text is None:
+            text = "".join(utterance["parts"]) if utterance else ""
+        if text:
+            self._enqueue(("utterance", "assistant", item_id, response_id, text, complete, time.time()))
+
+    def _enqueue(self, row: tuple) -> None:
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Transcript queue full, {self.dropped} rows dropped so far")
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+
+    def _write_loop(self):
+        try:
+            self._drain(self._connection)
+        except Exception as e:
+            logger.error(f"Transcript writer stopped: {e}")
+        finally:
+            self._connection.close()
+
+    def _drain(self, connection: sqlite3.Connection):
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # Keep collecting until the batch is full or flush_interval passed, fewer and larger transactions
+            # keep the writer from competing with the event loop for the GIL
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not self._stop:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            if self._stop in batch:
+                stopping = True
+                batch = [row for row in batch if row is not self._stop]
+            if batch:
+                self._write_batch(connection, batch)
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: list):
+        start = time.perf_counter()
+        utterances = [(self.session,) + row[1:] for row in batch if row[0] == "utterance"]
+        events = [(self.session,) + row[1:] for row in batch if row[0] == "event"]
+        try:
+            with connection:
+                if utterances:
+                    connection.executemany(
+                        "INSERT INTO utterances (session, role, item_id, response_id, text, complete, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        utterances
+                    )
+                if events:
+                    connection.executemany(
+                        "INSERT INTO events (session, name, payload, created_at) VALUES (?, ?, ?, ?)",
+                        events
+                    )
+        except sqlite3.Error as e:
+            logger.error(f"Error writing transcripts: {e}")
+            return
+
+        self.written += len(batch)
+        self.batches += 1
+        self.write_seconds += time.perf_counter() - start
+
+    def stats(self) -> Dict[str, Any]:
+        """Rows written, dropped and still pending, and the average batch write time."""
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+            "batches": self.batches,
+            "avg_batch_ms": self.write_seconds / self.batches * 1000 if self.batches else 0.0
+        }
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Store the open utterances, flush everything and stop the writer, waiting at most about timeout seconds."""
+        for item_id in list(self._open):
+            self._finish(item_id, complete=False)
+        if not self._writer.is_alive():
+            return
+        try:
+            # Waits only if the queue is full, until the writer makes room
+            self._queue.put(self._stop, timeout=timeout)
+        except queue.Full:
+            logger.error(f"Transcript writer is stuck, {self._queue.qsize()} rows not stored")
+            return
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            logger.error("Transcript writer did not finish in time")